@@ -1,13 +1,55 @@
-from z3 import Int, Real, IntVector, RealVector, Sum
-from z3 import Product, Optimize, Solver, And, Or, sat, If
 import random
 import os
+from array import array
+import ast
+import builtins
+import contextlib
+import copy
+import ctypes
+import functools
+import hashlib
+import importlib.util
+import itertools
+import marshal
+import mmap
+import queue
+import re
+import sys
+import tempfile
+import time
+import types
 try:
     import ujson as json
 except:
     import json
-import copy
-import time
+
+from ResultCache import ResultCache
+
+def _lazy(name):
+    # a module that is only imported on its first attribute access, so
+    # parsing and validating problems does not pay for z3, numpy and
+    # multiprocessing; None when it is not installed
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec == None:
+        return None
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    if '.' in name:
+        parent, _, child = name.rpartition('.')
+        setattr(sys.modules[parent], child, module)
+    return module
+
+z3 = _lazy('z3')
+if z3 == None:
+    raise ImportError('No module named z3, install z3-solver')
+np = _lazy('numpy')
+# only solve_many and the portfolio start processes
+_futures = _lazy('concurrent.futures')
+multiprocessing = _lazy('multiprocessing')
 
 _words = {
     'en': {
@@ -20,7 +62,1130 @@ _words = {
     }
 }
 
+_comp_func = {
+    '<': lambda x,y: x<y,
+    '<=': lambda x,y: x<=y,
+    '>': lambda x,y: x>y,
+    '>=': lambda x,y: x>=y,
+    '=': lambda x,y: x==y,
+}
+
+def _compile(expr):
+    # strings are compiled to code objects once, numbers are kept as they are
+    if isinstance(expr, str):
+        try:
+            return compile(expr, '<constraint>', 'eval')
+        except SyntaxError:
+            raise Exception('Illegal expression: {}'.format(expr))
+    return expr
+
+def _evaluate(code, val):
+    if isinstance(code, types.CodeType):
+        return eval(code, val)
+    return code
+
+def _names(code):
+    # every global name a compiled expression refers to, including comprehensions
+    if not isinstance(code, types.CodeType):
+        return set()
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _names(c) | set(c.co_varnames)
+    return names
+
+def _free_names(code):
+    # the names an expression reads from its globals; unlike _names, the
+    # variables of its own comprehensions are left out
+    if not isinstance(code, types.CodeType):
+        return set()
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _free_names(c) - set(c.co_varnames)
+    return names
+
+def _sample(rng, total, n):
+    # n distinct numbers of range(total) in random order; total may be far
+    # too large to list
+    if n * 2 >= total:
+        order = list(range(total))
+        rng.shuffle(order)
+        yield from order[:n]
+        return
+    seen = set()
+    while len(seen) < n:
+        k = rng.randrange(total)
+        if k not in seen:
+            seen.add(k)
+            yield k
+
+def _to_python(v):
+    # z3 numerals cannot leave the process they were created in
+    if v is None or isinstance(v, (bool, int, float)):
+        return v
+    if z3.is_int_value(v):
+        return v.as_long()
+    if z3.is_rational_value(v):
+        return float(v.as_fraction())
+    if z3.is_algebraic_value(v):
+        return float(v.approx(20).as_fraction())
+    return str(v)
+
+# names every expression may use besides inputs, parameters and loop variables
+_builtin_names = set(dir(builtins))
+
+# files larger than this are memory-mapped instead of read into memory
+_mmap_threshold = 1 << 20
+_token = re.compile(rb'\S+')
+
+def _compact(values, tp):
+    # ints go to array('q') and reals to array('d'); ints that overflow 64 bits stay a list
+    try:
+        return array('q' if tp == int else 'd', values)
+    except OverflowError:
+        return list(values)
+
+def _load_npy(path, tp):
+    if np == None:
+        raise Exception('numpy is needed to read {}'.format(path))
+    data = np.load(path, mmap_mode='r')
+    return _from_numpy(data, tp)
+
+def _from_numpy(data, tp):
+    # ints, as the text reader, only take integer data; a cast would truncate
+    if tp == int and data.dtype.kind not in 'iub':
+        raise Exception('Illegal input')
+    out = array('q' if tp == int else 'd')
+    out.frombytes(np.ascontiguousarray(data, dtype='=i8' if tp == int else '=f8').tobytes())
+    return out
+
+def _constant(expr):
+    # the value of an expression that does not depend on any name, else None
+    code = _compile(expr)
+    if isinstance(code, types.CodeType):
+        if code.co_names:
+            return None
+        code = eval(code, {})
+    return code if isinstance(code, (int, float)) and not isinstance(code, bool) else None
+
+def _affine(term, loopvar):
+    # the coefficient of a sum term c*x[loopvar], x[loopvar]*c or x[loopvar]:
+    # ('const', number), ('scalar', name) or ('array', name) for c[loopvar].
+    # None for any other term
+    try:
+        node = ast.parse(term.strip(), mode='eval').body
+    except SyntaxError:
+        return None
+
+    def is_index(n, name=None):
+        return isinstance(n, ast.Subscript) and isinstance(n.value, ast.Name) and \
+            (name == None or n.value.id == name) and \
+            isinstance(n.slice, ast.Name) and n.slice.id == loopvar
+
+    def coefficient(n):
+        if isinstance(n, ast.Constant) and isinstance(n.value, (int, float)) and \
+                not isinstance(n.value, bool):
+            return ('const', n.value)
+        if isinstance(n, ast.Name) and n.id not in ('x', 'y', loopvar):
+            return ('scalar', n.id)
+        if is_index(n) and n.value.id not in ('x', 'y'):
+            return ('array', n.value.id)
+        return None
+
+    if is_index(node, 'x'):
+        return ('const', 1)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+        if is_index(node.right, 'x'):
+            return coefficient(node.left)
+        if is_index(node.left, 'x'):
+            return coefficient(node.right)
+    return None
+
+def _linear(coefs, terms):
+    # the sum of coefs[k]*terms[k] for int terms and int coefficients, made by
+    # one Z3_mk_add over the products; the operator overloads would coerce and
+    # check every operand in Python. The products are wrapped, so z3 keeps them
+    # alive until the sum holds them
+    ctx = terms[0].ctx
+    ref = ctx.ref()
+    consts, products = {}, []
+    args = (z3.Ast * len(terms))()
+    pair = (z3.Ast * 2)()
+    for k, (v, t) in enumerate(zip(coefs, terms)):
+        if v == 1:
+            args[k] = t.as_ast()
+            continue
+        c = consts.get(v)
+        if c is None:
+            c = consts[v] = z3.IntVal(v, ctx)
+        pair[0], pair[1] = c.as_ast(), t.as_ast()
+        products.append(z3.ArithRef(z3.Z3_mk_mul(ref, 2, pair), ctx))
+        args[k] = products[-1].as_ast()
+    return z3.ArithRef(z3.Z3_mk_add(ref, len(terms), args), ctx)
+
+def _statistics(opt):
+    # the counters of the last check, conflicts, decisions, memory and so on
+    st = opt.statistics()
+    return {k: st.get_key_value(k) for k in st.keys()}
+
+@contextlib.contextmanager
+def _memory_limit(max_memory):
+    # z3 only has a process-wide memory limit, in megabytes; it holds for the
+    # checks inside the block and the previous limit is restored after it,
+    # so one limited solve does not limit every later one
+    if max_memory == None:
+        yield
+        return
+    previous = z3.get_param('memory_max_size')
+    z3.set_param('memory_max_size', int(max_memory))
+    try:
+        yield
+    finally:
+        z3.set_param('memory_max_size', previous)
+
+# seconds before a deadline at which a check counts as timed out: z3 timeouts
+# are whole milliseconds
+_deadline_slack = 0.01
+
+def _path_key(path):
+    return [int(p) for p in path.split('.')]
+
+class _Recorder:
+    # stands in for the solver while one constraint is expanded and keeps
+    # what is added through it, also by the constraints nested in it; with
+    # opt None it only keeps them
+    def __init__(self, opt=None):
+        self.opt = opt
+        self.added = []
+
+    def add(self, *args):
+        if self.opt != None:
+            self.opt.add(*args)
+        for a in args:
+            if isinstance(a, list):
+                self.added.extend(a)
+            else:
+                self.added.append(a)
+
+class _Intern:
+    # the atoms one build asserted, by AST id: z3 hash-conses its terms, so an
+    # atom that is built again has the same id and is not asserted twice.
+    # Stands in for the solver, and drops repeated operands of an or/and.
+    # An assertion is counted by count before it is added, so that
+    # n_constraint + n_duplicate is the n_constraint of a build without it
+    def __init__(self, opt, specs):
+        self.opt = opt
+        self.specs = specs
+        self.seen = set()
+        # the atoms of n_constraint an assertion stands for, by AST id
+        self.weights = {}
+
+    def add(self, *args):
+        keep = []
+        for a in args:
+            keep += self.unique(a if isinstance(a, list) else [a], self.seen, count=False)
+        if keep:
+            self.opt.add(keep)
+
+    def count(self, exprs, weight=1):
+        # exprs about to be asserted, each weight atoms (the operands of an
+        # or/and): n_constraint for the new ones, n_duplicate for the ones
+        # add will drop
+        new = set()
+        for e in exprs:
+            k = e.get_id() if z3.is_ast(e) else None
+            if k is not None and (k in self.seen or k in new):
+                self.specs['n_duplicate'] += weight
+                continue
+            self.specs['n_constraint'] += weight
+            if k is not None:
+                new.add(k)
+                self.weights.setdefault(k, weight)
+
+    def weight(self, e):
+        return self.weights.get(e.get_id(), 1) if z3.is_ast(e) else 1
+
+    def unique(self, exprs, seen=None, count=True):
+        seen = set() if seen is None else seen
+        out = []
+        for e in exprs:
+            if z3.is_ast(e):
+                k = e.get_id()
+                if k in seen:
+                    if count:
+                        self.specs['n_duplicate'] += 1
+                    continue
+                seen.add(k)
+            out.append(e)
+        return out
+
+@functools.lru_cache(None)
+def _ops():
+    # how _decode remakes an application of each operator from the context,
+    # the children and the decl parameters
+    def array(mk):
+        return lambda ref, args, params: mk(ref, len(args), (z3.Ast * len(args))(*args))
+    def fixed(mk):
+        return lambda ref, args, params: mk(ref, *args)
+    def pb(mk):
+        def make(ref, args, params):
+            n = len(args)
+            return mk(ref, n, (z3.Ast * n)(*args), (ctypes.c_int * n)(*params[1:]), params[0])
+        return make
+    def cardinality(mk):
+        return lambda ref, args, params: mk(ref, len(args), (z3.Ast * len(args))(*args),
+            params[0])
+    ops = {z3.Z3_OP_TRUE: lambda ref, args, params: z3.Z3_mk_true(ref),
+        z3.Z3_OP_FALSE: lambda ref, args, params: z3.Z3_mk_false(ref),
+        z3.Z3_OP_PB_AT_MOST: cardinality(z3.Z3_mk_atmost),
+        z3.Z3_OP_PB_AT_LEAST: cardinality(z3.Z3_mk_atleast)}
+    for op, mk in ((z3.Z3_OP_ADD, z3.Z3_mk_add), (z3.Z3_OP_SUB, z3.Z3_mk_sub),
+            (z3.Z3_OP_MUL, z3.Z3_mk_mul), (z3.Z3_OP_AND, z3.Z3_mk_and),
+            (z3.Z3_OP_OR, z3.Z3_mk_or), (z3.Z3_OP_DISTINCT, z3.Z3_mk_distinct)):
+        ops[op] = array(mk)
+    for op, mk in ((z3.Z3_OP_UMINUS, z3.Z3_mk_unary_minus), (z3.Z3_OP_NOT, z3.Z3_mk_not),
+            (z3.Z3_OP_TO_REAL, z3.Z3_mk_int2real), (z3.Z3_OP_TO_INT, z3.Z3_mk_real2int),
+            (z3.Z3_OP_DIV, z3.Z3_mk_div), (z3.Z3_OP_IDIV, z3.Z3_mk_div),
+            (z3.Z3_OP_MOD, z3.Z3_mk_mod), (z3.Z3_OP_REM, z3.Z3_mk_rem),
+            (z3.Z3_OP_POWER, z3.Z3_mk_power), (z3.Z3_OP_LE, z3.Z3_mk_le),
+            (z3.Z3_OP_GE, z3.Z3_mk_ge), (z3.Z3_OP_LT, z3.Z3_mk_lt), (z3.Z3_OP_GT, z3.Z3_mk_gt),
+            (z3.Z3_OP_EQ, z3.Z3_mk_eq), (z3.Z3_OP_IFF, z3.Z3_mk_eq),
+            (z3.Z3_OP_IMPLIES, z3.Z3_mk_implies), (z3.Z3_OP_XOR, z3.Z3_mk_xor),
+            (z3.Z3_OP_ITE, z3.Z3_mk_ite)):
+        ops[op] = fixed(mk)
+    for op, mk in ((z3.Z3_OP_PB_EQ, z3.Z3_mk_pbeq), (z3.Z3_OP_PB_LE, z3.Z3_mk_pble),
+            (z3.Z3_OP_PB_GE, z3.Z3_mk_pbge)):
+        ops[op] = pb(mk)
+    return ops
+
+def _encode(exprs):
+    # the DAG of exprs as plain tuples that pickle, children before their
+    # parents: (op, payload, children) with op None for a numeral, whose
+    # payload is (sort kind, digits), Z3_OP_UNINTERPRETED for a constant
+    # (name, sort kind) and the decl parameters otherwise. SMT-LIB text would
+    # not do: it reads -3 back as (- 3), a different term. z3 hash-conses
+    # terms, so a term is known by its address, which costs no call into z3
+    ref = exprs[0].ctx.ref() if exprs else None
+    ops = _ops()
+    nodes, index, roots = [], {}, []
+    for e in exprs:
+        stack = [e.as_ast()]
+        while stack:
+            a = stack[-1]
+            k = a.value
+            if k in index:
+                stack.pop()
+                continue
+            kind = z3.Z3_get_ast_kind(ref, a)
+            if kind == z3.Z3_NUMERAL_AST:
+                sort = z3.Z3_get_sort_kind(ref, z3.Z3_get_sort(ref, a))
+                nodes.append((None, (sort, z3.Z3_get_numeral_string(ref, a)), ()))
+            elif kind != z3.Z3_APP_AST:
+                raise Exception('Cannot ship a term of AST kind {}'.format(kind))
+            else:
+                n = z3.Z3_get_app_num_args(ref, a)
+                args = [z3.Z3_get_app_arg(ref, a, j) for j in range(n)]
+                ids = [c.value for c in args]
+                missing = [c for c, j in zip(args, ids) if j not in index]
+                if missing:
+                    stack.extend(missing)
+                    continue
+                d = z3.Z3_get_app_decl(ref, a)
+                op = z3.Z3_get_decl_kind(ref, d)
+                if op == z3.Z3_OP_UNINTERPRETED and n == 0:
+                    payload = (z3.Z3_get_symbol_string(ref, z3.Z3_get_decl_name(ref, d)),
+                        z3.Z3_get_sort_kind(ref, z3.Z3_get_range(ref, d)))
+                elif op in ops:
+                    payload = tuple(z3.Z3_get_decl_int_parameter(ref, d, j)
+                        for j in range(z3.Z3_get_decl_num_parameters(ref, d)))
+                else:
+                    raise Exception('Cannot ship a term of operator {}'.format(
+                        z3.Z3_get_symbol_string(ref, z3.Z3_get_decl_name(ref, d))))
+                nodes.append((op, payload, tuple(index[j] for j in ids)))
+            index[k] = len(nodes) - 1
+            stack.pop()
+        roots.append(index[e.as_ast().value])
+    return nodes, roots
+
+def _decode(nodes, roots, ctx=None):
+    # the terms _encode shipped, made again by the calls that built them, so
+    # z3 hash-conses them to the very terms a serial build gives
+    ctx = z3.get_ctx(ctx)
+    ref = ctx.ref()
+    ops = _ops()
+    sorts = {z3.Z3_INT_SORT: z3.IntSort(ctx), z3.Z3_REAL_SORT: z3.RealSort(ctx),
+        z3.Z3_BOOL_SORT: z3.BoolSort(ctx)}
+    made = []
+    for op, payload, children in nodes:
+        if op is None:
+            a = z3.Z3_mk_numeral(ref, payload[1], sorts[payload[0]].ast)
+        elif op == z3.Z3_OP_UNINTERPRETED:
+            a = z3.Const(payload[0], sorts[payload[1]]).as_ast()
+        else:
+            a = ops[op](ref, [made[c].as_ast() for c in children], payload)
+        # wrapped at once, so z3 keeps the term alive while its parents are made
+        made.append(z3.AstRef(a, ctx))
+    return [z3.BoolRef(made[r].as_ast(), ctx) for r in roots]
+
+@functools.lru_cache(None)
+def _smt_ops():
+    # the SMT-LIB2 symbol of each operator _encode ships and the sort of its
+    # application: a sort kind, 'arith' for Real when a child is and Int
+    # else, or 'then' for the sort of the second child
+    bool_, int_, real = z3.Z3_BOOL_SORT, z3.Z3_INT_SORT, z3.Z3_REAL_SORT
+    return {z3.Z3_OP_TRUE: ('true', bool_), z3.Z3_OP_FALSE: ('false', bool_),
+        z3.Z3_OP_AND: ('and', bool_), z3.Z3_OP_OR: ('or', bool_), z3.Z3_OP_NOT: ('not', bool_),
+        z3.Z3_OP_IMPLIES: ('=>', bool_), z3.Z3_OP_XOR: ('xor', bool_),
+        z3.Z3_OP_IFF: ('=', bool_), z3.Z3_OP_EQ: ('=', bool_),
+        z3.Z3_OP_DISTINCT: ('distinct', bool_), z3.Z3_OP_LE: ('<=', bool_),
+        z3.Z3_OP_GE: ('>=', bool_), z3.Z3_OP_LT: ('<', bool_), z3.Z3_OP_GT: ('>', bool_),
+        z3.Z3_OP_PB_LE: ('pble', bool_), z3.Z3_OP_PB_GE: ('pbge', bool_),
+        z3.Z3_OP_PB_EQ: ('pbeq', bool_), z3.Z3_OP_PB_AT_MOST: ('at-most', bool_),
+        z3.Z3_OP_PB_AT_LEAST: ('at-least', bool_), z3.Z3_OP_ITE: ('ite', 'then'),
+        z3.Z3_OP_ADD: ('+', 'arith'), z3.Z3_OP_SUB: ('-', 'arith'),
+        z3.Z3_OP_MUL: ('*', 'arith'), z3.Z3_OP_UMINUS: ('-', 'arith'),
+        z3.Z3_OP_POWER: ('^', 'arith'), z3.Z3_OP_TO_REAL: ('to_real', real),
+        z3.Z3_OP_TO_INT: ('to_int', int_), z3.Z3_OP_DIV: ('/', real),
+        z3.Z3_OP_IDIV: ('div', int_), z3.Z3_OP_MOD: ('mod', int_), z3.Z3_OP_REM: ('rem', int_)}
+
+_smt_symbol = re.compile(r'[A-Za-z~!@$%^&*_+=<>.?/-][0-9A-Za-z~!@$%^&*_+=<>.?/-]*$')
+
+def _write_smt(f, exprs):
+    # exprs as SMT-LIB2 commands on f, every term that more than one parent
+    # shares defined once by a define-fun and referred to by its name.
+    # opt.sexpr() prints a term in full wherever it occurs, which makes a
+    # chain of shared prefix sums quadratic in its length
+    nodes, roots = _encode(exprs)
+    ops = _smt_ops()
+    names = {z3.Z3_BOOL_SORT: 'Bool', z3.Z3_INT_SORT: 'Int', z3.Z3_REAL_SORT: 'Real'}
+    refs = [0] * len(nodes)
+    for _, _, children in nodes:
+        for c in children:
+            refs[c] += 1
+    for r in roots:
+        refs[r] += 1
+    text, sorts = [None] * len(nodes), [None] * len(nodes)
+    for k, (op, payload, children) in enumerate(nodes):
+        if op is None:
+            sorts[k], digits = payload
+            sign = digits.startswith('-')
+            num, _, den = digits.lstrip('-').partition('/')
+            if sorts[k] == z3.Z3_REAL_SORT:
+                num = '{}.0'.format(num) if den == '' else '(/ {}.0 {}.0)'.format(num, den)
+            text[k] = '(- {})'.format(num) if sign else num
+            continue
+        if op == z3.Z3_OP_UNINTERPRETED:
+            name, sorts[k] = payload
+            text[k] = name if _smt_symbol.match(name) else '|{}|'.format(name)
+            f.write('(declare-fun {} () {})\n'.format(text[k], names[sorts[k]]))
+            continue
+        head, sort = ops[op]
+        if sort == 'then':
+            sort = sorts[children[1]]
+        elif sort == 'arith':
+            sort = z3.Z3_REAL_SORT if any(sorts[c] == z3.Z3_REAL_SORT for c in children) \
+                else z3.Z3_INT_SORT
+        sorts[k] = sort
+        if payload:
+            head = '(_ {} {})'.format(head, ' '.join(map(str, payload)))
+        if children:
+            term = '({} {})'.format(head, ' '.join(text[c] for c in children))
+        else:
+            term = head
+        for c in children:
+            # a term with one parent is only written inside it
+            if refs[c] == 1 and nodes[c][0] not in (None, z3.Z3_OP_UNINTERPRETED):
+                text[c] = None
+        if refs[k] > 1 and children:
+            text[k] = '$t{}'.format(k)
+            f.write('(define-fun {} () {} {})\n'.format(text[k], names[sort], term))
+        else:
+            text[k] = term
+    for r in roots:
+        f.write('(assert {})\n'.format(text[r]))
+
+class _Profile:
+    # counters of one build by constraint path: calls, time with and without
+    # the nested constraints, and what the constraint emitted itself: atoms,
+    # new AST nodes and the growth of z3's allocations. A node shared by
+    # several atoms counts for the first constraint that emitted it. z3 counts
+    # its allocations in blocks, so memory is only telling for constraints
+    # that build a lot. The time spent walking the ASTs is left out
+    def __init__(self):
+        self.entries = {}
+        self.seen = set()
+        self.active = None
+        # time, atoms by id, memory and profiling overhead of the nested
+        # constraints; the atoms are kept so their ids stay unique
+        self.nested = [[0.0, {}, 0, 0.0]]
+
+    def run(self, con, opt, retList, parse):
+        entry = self.entries.get(con.path)
+        if entry == None:
+            entry = self.entries[con.path] = {'path': con.path, 'type': con.type,
+                'calls': 0, 'time': 0.0, 'time_self': 0.0, 'n_atom': 0, 'ast_size': 0,
+                'memory': 0}
+        recorder = _Recorder(opt)
+        emitted = [] if retList != None else None
+        self.nested.append([0.0, {}, 0, 0.0])
+        memory = z3.Z3_get_estimated_alloc_size()
+        now = time.perf_counter()
+        self.active = con
+        parse(recorder, emitted)
+        spent = time.perf_counter() - now
+        memory = z3.Z3_get_estimated_alloc_size() - memory
+        nested_time, nested_atoms, nested_memory, overhead = self.nested.pop()
+
+        # atoms of nested constraints pass through here or end up in an Or/And
+        atoms = recorder.added + (emitted or [])
+        own = [a for a in atoms if id(a) not in nested_atoms]
+        now = time.perf_counter()
+        entry['ast_size'] += self._ast_size(own)
+        walk = time.perf_counter() - now
+
+        spent -= overhead
+        entry['calls'] += 1
+        entry['time'] += spent
+        entry['time_self'] += spent - nested_time
+        entry['n_atom'] += len(own)
+        entry['memory'] += memory - nested_memory
+        outer = self.nested[-1]
+        outer[0] += spent
+        outer[1].update((id(a), a) for a in own)
+        outer[1].update(nested_atoms)
+        outer[2] += memory
+        outer[3] += overhead + walk
+        if retList != None:
+            retList.extend(emitted)
+
+    def _ast_size(self, exprs):
+        size, stack = 0, [e for e in exprs if z3.is_ast(e)]
+        while stack:
+            e = stack.pop()
+            k = e.get_id()
+            if k in self.seen:
+                continue
+            self.seen.add(k)
+            size += 1
+            if z3.is_app(e):
+                stack.extend(e.children())
+        return size
+
+    def records(self):
+        return [self.entries[p] for p in sorted(self.entries, key=_path_key)]
+
+def _folded(records, time_solve=None):
+    # one 'build;0:loop;0.1:sum <microseconds>' line per constraint with its
+    # own time, the input of flamegraph.pl and speedscope
+    types_ = {r['path']: r['type'] for r in records}
+    lines = []
+    for r in records:
+        parts = r['path'].split('.')
+        frames = ['build']
+        for k in range(len(parts)):
+            p = '.'.join(parts[:k+1])
+            frames.append('{}:{}'.format(p, types_.get(p, '?')))
+        lines.append('{} {}'.format(';'.join(frames), int(round(r['time_self'] * 1e6))))
+    if time_solve != None:
+        lines.append('solve {}'.format(int(round(time_solve * 1e6))))
+    return '\n'.join(lines) + '\n'
+
+def _flat(args):
+    # Or(a, b) and Or([a, b]) alike
+    return args[0] if len(args) == 1 and isinstance(args[0], (list, tuple)) else args
+
+_scalar_funcs = {
+    'Or': lambda *a: any(_flat(a)),
+    'And': lambda *a: all(_flat(a)),
+    'If': lambda c, a, b: a if c else b,
+}
+
+_vector_funcs = {
+    'Or': lambda *a: functools.reduce(lambda p, q: np.logical_or(p, q), _flat(a), False),
+    'And': lambda *a: functools.reduce(lambda p, q: np.logical_and(p, q), _flat(a), True),
+    'If': lambda c, a, b: np.where(c, a, b),
+    'min': lambda *a: functools.reduce(np.minimum, a) if len(a) > 1 else min(a[0]),
+    'max': lambda *a: functools.reduce(np.maximum, a) if len(a) > 1 else max(a[0]),
+}
+
+class _Checker:
+    # evaluates constraints on concrete numbers, as the build would assert
+    # them. A loop is evaluated for all its indices at once with numpy when its
+    # body allows it: elementwise terms, or/and of those, and sums whose window
+    # moves with the loop while their term does not, which are read off one
+    # cumulative sum. Everything else, and everything without numpy, is
+    # evaluated one binding at a time. failures maps a constraint path to the
+    # constraint, the number of failing bindings and the first few of them
+    grid_limit = 1 << 24
+
+    def __init__(self, values, tolerance=0):
+        self.tolerance = tolerance
+        self.values = dict(values, **_scalar_funcs)
+        self.arrays = None
+        if np != None:
+            self.arrays = {k: np.asarray(v) for k, v in values.items()
+                if hasattr(v, '__len__') and not isinstance(v, str)}
+            self.arrays.update(_vector_funcs)
+        self.failures = {}
+
+    def compare(self, comp, a, b):
+        if comp not in _comp_func:
+            raise Exception('Illegal comparison operator: {}'.format(comp))
+        t = self.tolerance
+        if not t:
+            return _comp_func[comp](a, b)
+        t = t * (1 + abs(b))
+        if comp == '=':
+            return abs(a - b) <= t
+        if comp in ('<', '<='):
+            return _comp_func[comp](a, b + t)
+        return _comp_func[comp](a, b - t)
+
+    def truth(self, con, term, val):
+        if con.comp != None and con.rval != None:
+            return self.compare(con.comp, term, _evaluate(con.code_rval, val))
+        return term
+
+    def fail(self, con, count, bindings):
+        entry = self.failures.setdefault(con.path, [con, 0, []])
+        entry[1] += count
+        entry[2].extend(bindings[:3 - len(entry[2])])
+
+    def check(self, con, val, bindings=()):
+        # a constraint whose atoms go to the solver, with the loop variables
+        # of the enclosing loops bound in val
+        if con.type != 'loop':
+            bad = [t for t in self.atoms(con, val) if not t]
+            if bad:
+                self.fail(con, len(bad), [bindings])
+            return
+
+        lbound = ProblemModel._get_number(con.code_range[0], val)
+        ubound = ProblemModel._get_number(con.code_range[1], val)
+        rows = self.vector_loop(con, val, lbound, ubound)
+        if rows != None:
+            for c, truths in rows:
+                bad = np.flatnonzero(~truths)
+                if len(bad):
+                    self.fail(c, len(bad), [bindings + ((con.loopvar, lbound + int(k)),)
+                        for k in bad[:3]])
+            return
+        if con.loopvar in val:
+            raise Exception('Loop variable {} already exists.'.format(con.loopvar))
+        for i in range(lbound, ubound+1):
+            val[con.loopvar] = i
+            inner = bindings + ((con.loopvar, i),)
+            if isinstance(con.term, str):
+                if not self.truth(con, eval(con.code_term, val), val):
+                    self.fail(con, 1, [inner])
+            else:
+                for c in con.term:
+                    self.check(c, val, inner)
+        val.pop(con.loopvar, None)
+
+    def atoms(self, con, val):
+        # the truth of every atom the constraint gives to the solver or to an
+        # enclosing or/and
+        if con.type == 'single':
+            return [self.truth(con, eval(con.code_term, val), val)]
+        if con.type in ('sum', 'product'):
+            return [self.truth(con, self.reduce(con, val), val)]
+        if con.type in ('or', 'and'):
+            truths = [t for c in con.term for t in self.atoms(c, val)]
+            return [any(truths) if con.type == 'or' else all(truths)]
+
+        lbound = ProblemModel._get_number(con.code_range[0], val)
+        ubound = ProblemModel._get_number(con.code_range[1], val)
+        rows = self.vector_loop(con, val, lbound, ubound)
+        if rows != None:
+            return [bool(t) for _, truths in rows for t in truths]
+        if con.loopvar in val:
+            raise Exception('Loop variable {} already exists.'.format(con.loopvar))
+        truths = []
+        for i in range(lbound, ubound+1):
+            val[con.loopvar] = i
+            if isinstance(con.term, str):
+                truths.append(self.truth(con, eval(con.code_term, val), val))
+            else:
+                for c in con.term:
+                    truths.extend(self.atoms(c, val))
+        val.pop(con.loopvar, None)
+        return truths
+
+    def reduce(self, con, val):
+        # the value of a sum or product for the loop variables bound in val
+        if con.type == 'sum' and self.arrays != None:
+            try:
+                return self.window(con, dict(val, **self.arrays), 1)[0]
+            except Exception:
+                pass
+        terms = eval(con.code_list, val)
+        if con.type == 'sum':
+            return sum(terms)
+        p = 1
+        for t in terms:
+            p = p * t
+        return p
+
+    def vector_loop(self, con, val, lbound, ubound):
+        # [(constraint, truth of every index)] for the body of a loop, or None
+        # when it does not vectorize
+        if self.arrays == None or con.loopvar in val:
+            return None
+        m = ubound - lbound + 1
+        if m <= 0:
+            return []
+        vval = dict(val, **self.arrays)
+        vval[con.loopvar] = np.arange(lbound, ubound+1)
+        try:
+            if isinstance(con.term, str):
+                truths = self.truth(con, eval(con.code_term, vval), vval)
+                return [(con, np.broadcast_to(np.asarray(truths, dtype=bool), (m,)))]
+            return [(c, self.vector_truth(c, vval, con.loopvar, m)) for c in con.term]
+        except Exception:
+            return None
+
+    def vector_truth(self, con, vval, var, m):
+        # the truth of one atom per index of the loop variable var
+        if con.type == 'single':
+            truths = self.truth(con, eval(con.code_term, vval), vval)
+        elif con.type == 'sum':
+            truths = self.truth(con, self.window(con, vval, m, var), vval)
+        elif con.type in ('or', 'and'):
+            rows = [self.vector_grid(c, vval, var, m, con.type) if c.type == 'loop' else
+                self.vector_truth(c, vval, var, m) for c in con.term]
+            join = np.logical_or if con.type == 'or' else np.logical_and
+            truths = functools.reduce(join, rows, con.type == 'and')
+        else:
+            raise Exception('Cannot vectorize a {} here'.format(con.type))
+        return np.broadcast_to(np.asarray(truths, dtype=bool), (m,))
+
+    def vector_grid(self, con, vval, var, m, join):
+        # a loop inside an or/and: its term on a grid of the outer index var
+        # by its own, reduced along its own index. Only for constant bounds
+        # and grids of at most grid_limit cells
+        lbound = _evaluate(con.code_range[0], vval)
+        ubound = _evaluate(con.code_range[1], vval)
+        if not isinstance(con.term, str) or np.ndim(lbound) or np.ndim(ubound):
+            raise Exception('Cannot vectorize this loop')
+        r = int(ubound) - int(lbound) + 1
+        if r <= 0:
+            # an empty loop adds no atoms
+            return np.full(m, join == 'and')
+        if m * r > self.grid_limit:
+            raise Exception('Grid too large')
+        outer = vval[var]
+        vval[var] = outer[:, None]
+        vval[con.loopvar] = np.arange(int(lbound), int(ubound)+1)[None, :]
+        try:
+            truths = self.truth(con, eval(con.code_term, vval), vval)
+        finally:
+            vval[var] = outer
+            del vval[con.loopvar]
+        truths = np.broadcast_to(np.asarray(truths, dtype=bool), (m, r))
+        return truths.all(axis=1) if join == 'and' else truths.any(axis=1)
+
+    def window(self, con, vval, m, var=None):
+        # m sums of the term over windows that may move with var, as
+        # differences of one cumulative sum; an empty window sums to 0
+        if var != None and var in _names(con.code_term):
+            raise Exception('Cannot vectorize a sum whose term depends on {}'.format(var))
+        lo = np.broadcast_to(np.asarray(_evaluate(con.code_range[0], vval)), (m,))
+        hi = np.broadcast_to(np.asarray(_evaluate(con.code_range[1], vval)), (m,))
+        if lo.dtype.kind not in 'iu' or hi.dtype.kind not in 'iu':
+            raise Exception('Illegal range')
+        nonempty = hi >= lo
+        if not nonempty.any():
+            return np.zeros(m, dtype=int)
+        start, stop = int(lo[nonempty].min()), int(hi[nonempty].max())
+        vval[con.loopvar] = np.arange(start, stop+1)
+        try:
+            terms = np.broadcast_to(np.asarray(eval(con.code_term, vval)), (stop-start+1,))
+        finally:
+            del vval[con.loopvar]
+        if terms.dtype.kind not in 'iuf':
+            raise Exception('Illegal term')
+        cs = np.concatenate(([0], np.cumsum(terms)))
+        size = stop - start + 1
+        upper = cs[np.clip(hi - start + 1, 0, size)]
+        lower = cs[np.clip(lo - start, 0, size)]
+        return np.where(nonempty, upper - lower, 0)
+
+    def messages(self):
+        out = []
+        for path in sorted(self.failures, key=_path_key):
+            con, count, first = self.failures[path]
+            what = con.type
+            if isinstance(con.term, str):
+                what = '{} {}'.format(con.type, con.term)
+                if con.comp != None and con.rval != None:
+                    what += ' {} {}'.format(con.comp, con.rval)
+            at = '; '.join(', '.join('{}={}'.format(k, v) for k, v in b) for b in first if b)
+            out.append('Constraint {} ({}) fails {} time{}{}'.format(path, what, count,
+                '' if count == 1 else 's', ', first at ' + at if at else ''))
+        return out
+
+def _simplex(c, a_ub, b_ub, a_eq, b_eq, lo, hi, tol=1e-9, max_iter=None):
+    # maximizes c @ z subject to a_ub @ z <= b_ub, a_eq @ z == b_eq and
+    # lo <= z <= hi (-inf and inf allowed) with a dense two-phase tableau and
+    # Bland's rule. Returns (status, z, value), status is optimal, infeasible,
+    # unbounded or limit when max_iter pivots did not finish
+    n = len(c)
+    # z = offset + shift @ u with u >= 0; finite upper bounds become rows
+    cols, offset, uppers = [], np.zeros(n), []
+    for j in range(n):
+        if np.isfinite(lo[j]):
+            offset[j] = lo[j]
+            cols.append((j, 1.0))
+            if np.isfinite(hi[j]):
+                uppers.append((len(cols) - 1, hi[j] - lo[j]))
+        elif np.isfinite(hi[j]):
+            offset[j] = hi[j]
+            cols.append((j, -1.0))
+        else:
+            cols += [(j, 1.0), (j, -1.0)]
+    shift = np.zeros((n, len(cols)))
+    for k, (j, s) in enumerate(cols):
+        shift[j, k] = s
+    width = len(cols)
+    upper = np.zeros((len(uppers), width))
+    for r, (k, _) in enumerate(uppers):
+        upper[r, k] = 1.0
+    rows = np.vstack([a_ub @ shift, upper, a_eq @ shift])
+    rhs = np.concatenate([b_ub - a_ub @ offset, [b for _, b in uppers], b_eq - a_eq @ offset])
+    n_ub = len(b_ub) + len(uppers)
+
+    # a slack per inequality, an artificial per row that has no slack basis:
+    # equalities and inequalities with a negative right-hand side
+    m = len(rhs)
+    flip = rhs < 0
+    rows[flip] *= -1
+    rhs = np.abs(rhs)
+    needs = [i for i in range(m) if i >= n_ub or flip[i]]
+    tableau = np.zeros((m + 1, width + n_ub + len(needs) + 1))
+    tableau[:m, :width] = rows
+    tableau[:m, -1] = rhs
+    basis = [0] * m
+    for i in range(n_ub):
+        tableau[i, width + i] = -1.0 if flip[i] else 1.0
+        basis[i] = width + i
+    artificial = width + n_ub
+    for k, i in enumerate(needs):
+        tableau[i, artificial + k] = 1.0
+        basis[i] = artificial + k
+    limit = max_iter or 50 * (m + width + n_ub)
+
+    def pivot(r, j):
+        tableau[r] /= tableau[r, j]
+        factors = tableau[:, j].copy()
+        factors[r] = 0
+        tableau[:] -= np.outer(factors, tableau[r])
+        basis[r] = j
+
+    def run(allowed):
+        # the last row holds the reduced costs of a maximization
+        for _ in range(limit):
+            entering = np.flatnonzero(tableau[-1, :allowed] < -tol)
+            if len(entering) == 0:
+                return 'optimal'
+            j = entering[0]
+            column = tableau[:-1, j]
+            positive = np.flatnonzero(column > tol)
+            if len(positive) == 0:
+                return 'unbounded'
+            ratios = tableau[positive, -1] / column[positive]
+            ties = positive[ratios <= ratios.min() + tol]
+            r = min(ties, key=lambda i: basis[i])
+            pivot(r, j)
+        return 'limit'
+
+    # phase 1 maximizes minus the sum of the artificials
+    if needs:
+        tableau[-1, artificial:-1] = 1.0
+        for i in needs:
+            tableau[-1] -= tableau[i]
+        status = run(tableau.shape[1] - 1)
+        if status == 'limit':
+            return status, None, None
+        if tableau[-1, -1] < -tol * max(1.0, np.abs(rhs).max()):
+            return 'infeasible', None, None
+        # artificials left in the basis at zero are pivoted out or their rows dropped
+        keep = []
+        for i in range(m):
+            if basis[i] >= artificial:
+                nonzero = np.flatnonzero(np.abs(tableau[i, :artificial]) > tol)
+                if len(nonzero) == 0:
+                    continue
+                pivot(i, nonzero[0])
+            keep.append(i)
+        tableau = np.vstack([tableau[keep], tableau[-1:]])
+        tableau = np.hstack([tableau[:, :artificial], tableau[:, -1:]])
+        basis = [basis[i] for i in keep]
+
+    # phase 2
+    cost = np.zeros(tableau.shape[1] - 1)
+    cost[:width] = c @ shift
+    tableau[-1, :-1] = -cost
+    tableau[-1, -1] = 0.0
+    for i, j in enumerate(basis):
+        if tableau[-1, j] != 0:
+            tableau[-1] -= tableau[-1, j] * tableau[i]
+    status = run(tableau.shape[1] - 1)
+    if status != 'optimal':
+        return status, None, None
+    u = np.zeros(tableau.shape[1] - 1)
+    for i, j in enumerate(basis):
+        u[j] = tableau[i, -1]
+    z = offset + shift @ u[:width]
+    return 'optimal', z, float(c @ z)
+
+
+class _Relaxation:
+    # the LP relaxation of built assertions: linear atoms, the atoms of an And,
+    # pseudo-Boolean constraints, and the bounds hull of an Or whose atoms all
+    # bound one variable. Everything else is left out, which only weakens it.
+    # Ints and Bools (as 0/1) become continuous columns; a linear term with
+    # more than term_limit entries gets a column of its own, so the prefix
+    # sum chains stay linear in size
+    term_limit = 64
+
+    def __init__(self):
+        self.columns = {}
+        self.integral = []
+        self.lo, self.hi = [], []
+        self.rows = []
+        self.forms = {}
+
+    def column(self, name, sort, integral):
+        k = self.columns.get(name)
+        if k == None:
+            k = self.columns[name] = len(self.integral)
+            self.integral.append(integral)
+            self.lo.append(0.0 if sort == 'bool' else -np.inf)
+            self.hi.append(1.0 if sort == 'bool' else np.inf)
+        return k
+
+    def variable(self, e):
+        sort = 'bool' if z3.is_bool(e) else 'int' if z3.is_int(e) else 'real'
+        return self.column(e.decl().name(), sort, sort != 'real')
+
+    def form(self, e):
+        # (coefficients by column, constant) of an arithmetic term, None when
+        # it is not linear; terms are shared, so forms are kept by AST id
+        stack = [e]
+        while stack:
+            a = stack[-1]
+            k = a.get_id()
+            if k in self.forms:
+                stack.pop()
+                continue
+            args = a.children() if z3.is_app(a) else []
+            missing = [c for c in args if c.get_id() not in self.forms and not z3.is_bool(c)]
+            if missing and not z3.is_const(a):
+                stack.extend(missing)
+                continue
+            stack.pop()
+            self.forms[k] = self.combine(a, args)
+        return self.forms[e.get_id()]
+
+    def combine(self, a, args):
+        if z3.is_int_value(a) or z3.is_rational_value(a):
+            return {}, float(a.as_fraction()) if z3.is_rational_value(a) else float(a.as_long())
+        if z3.is_const(a) and a.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            return {self.variable(a): 1.0}, 0.0
+        if not z3.is_app(a):
+            return None
+        op = a.decl().kind()
+        if op == z3.Z3_OP_ITE:
+            # If(b, t, f) with a Bool variable b and constant branches
+            b, t, f = args
+            t, f = self.forms.get(t.get_id()), self.forms.get(f.get_id())
+            if not (z3.is_const(b) and b.decl().kind() == z3.Z3_OP_UNINTERPRETED) or \
+                    t == None or f == None or t[0] or f[0]:
+                return None
+            return {self.variable(b): t[1] - f[1]}, f[1]
+        forms = [self.forms.get(c.get_id()) for c in args]
+        if any(f == None for f in forms):
+            return None
+        if op == z3.Z3_OP_TO_REAL:
+            return forms[0]
+        if op == z3.Z3_OP_UMINUS:
+            return {k: -v for k, v in forms[0][0].items()}, -forms[0][1]
+        if op in (z3.Z3_OP_ADD, z3.Z3_OP_SUB):
+            coefs, const = dict(forms[0][0]), forms[0][1]
+            sign = -1.0 if op == z3.Z3_OP_SUB else 1.0
+            for f, c in forms[1:]:
+                for k, v in f.items():
+                    coefs[k] = coefs.get(k, 0.0) + sign * v
+                const += sign * c
+            return self.share(coefs, const)
+        if op == z3.Z3_OP_MUL:
+            terms = [f for f in forms if f[0]]
+            if len(terms) > 1:
+                return None
+            scale = 1.0
+            for f in forms:
+                if not f[0]:
+                    scale *= f[1]
+            if not terms:
+                return {}, scale
+            return {k: scale * v for k, v in terms[0][0].items()}, scale * terms[0][1]
+        return None
+
+    def share(self, coefs, const):
+        if len(coefs) <= self.term_limit:
+            return coefs, const
+        k = self.column('_t{}'.format(len(self.integral)), 'real', False)
+        row = dict(coefs)
+        row[k] = -1.0
+        self.rows.append((row, '=', 0.0))
+        return {k: 1.0}, const
+
+    def atoms(self, e):
+        # the rows of an assertion as (coefficients, '<=' or '=', rhs), None
+        # when it is not one the relaxation knows
+        if z3.is_and(e):
+            rows = []
+            for c in e.children():
+                rows += self.atoms(c) or []
+            return rows
+        if z3.is_or(e):
+            return self.hull(e)
+        if not z3.is_app(e):
+            return None
+        op = e.decl().kind()
+        if z3.is_const(e) and op == z3.Z3_OP_UNINTERPRETED:
+            return [({self.variable(e): 1.0}, '=', 1.0)]
+        if op in (z3.Z3_OP_PB_EQ, z3.Z3_OP_PB_LE, z3.Z3_OP_PB_GE, z3.Z3_OP_PB_AT_MOST,
+                z3.Z3_OP_PB_AT_LEAST):
+            params = e.decl().params()
+            args = e.children()
+            if not all(z3.is_const(b) and b.decl().kind() == z3.Z3_OP_UNINTERPRETED for b in args):
+                return None
+            weights = params[1:] if len(params) > 1 else [1] * len(args)
+            coefs = {}
+            for b, w in zip(args, weights):
+                k = self.variable(b)
+                coefs[k] = coefs.get(k, 0.0) + w
+            if op == z3.Z3_OP_PB_EQ:
+                return [(coefs, '=', float(params[0]))]
+            if op in (z3.Z3_OP_PB_LE, z3.Z3_OP_PB_AT_MOST):
+                return [(coefs, '<=', float(params[0]))]
+            return [({k: -v for k, v in coefs.items()}, '<=', -float(params[0]))]
+        if op not in (z3.Z3_OP_LE, z3.Z3_OP_GE, z3.Z3_OP_LT, z3.Z3_OP_GT, z3.Z3_OP_EQ):
+            return None
+        left, right = e.children()
+        if z3.is_bool(left):
+            return None
+        left, right = self.form(left), self.form(right)
+        if left == None or right == None:
+            return None
+        coefs = dict(left[0])
+        for k, v in right[0].items():
+            coefs[k] = coefs.get(k, 0.0) - v
+        coefs = {k: v for k, v in coefs.items() if v != 0}
+        rhs = right[1] - left[1]
+        if op in (z3.Z3_OP_GE, z3.Z3_OP_GT):
+            coefs, rhs = {k: -v for k, v in coefs.items()}, -rhs
+        if op in (z3.Z3_OP_LT, z3.Z3_OP_GT) and all(self.integral[k] and v == int(v)
+                for k, v in coefs.items()):
+            # strict over integers
+            rhs = np.ceil(rhs) - 1
+        return [(coefs, '=' if op == z3.Z3_OP_EQ else '<=', rhs)]
+
+    def hull(self, e):
+        # the bounds of one variable that every operand of an Or implies
+        lo, hi, column = np.inf, -np.inf, None
+        for c in e.children():
+            rows = self.atoms(c)
+            if not rows:
+                return None
+            bounds = [-np.inf, np.inf]
+            for coefs, sense, rhs in rows:
+                if len(coefs) != 1:
+                    return None
+                (k, v), = coefs.items()
+                if column not in (None, k):
+                    return None
+                column = k
+                if sense == '=' or v > 0:
+                    bounds[1] = min(bounds[1], rhs / v)
+                if sense == '=' or v < 0:
+                    bounds[0] = max(bounds[0], rhs / v)
+            lo, hi = min(lo, bounds[0]), max(hi, bounds[1])
+        rows = []
+        if np.isfinite(hi):
+            rows.append(({column: 1.0}, '<=', hi))
+        if np.isfinite(lo):
+            rows.append(({column: -1.0}, '<=', -lo))
+        return rows
+
+    def add(self, e):
+        rows = self.atoms(e)
+        if rows == None:
+            return False
+        self.rows += rows
+        return True
+
+    def solve(self, objective, goal, cell_limit=1 << 22):
+        # maximizes or minimizes the linear term objective; one-column rows
+        # become bounds. Returns (status, column values, value)
+        coefs, const = self.form(objective)
+        n = len(self.integral)
+        lo, hi = np.array(self.lo, dtype=float), np.array(self.hi, dtype=float)
+        ub, eq = [], []
+        for row, sense, rhs in self.rows:
+            row = {k: v for k, v in row.items() if v != 0}
+            if len(row) == 1:
+                (k, v), = row.items()
+                b = rhs / v
+                if self.integral[k]:
+                    b = np.floor(b + 1e-9) if v > 0 else np.ceil(b - 1e-9)
+                if sense == '=' or v > 0:
+                    hi[k] = min(hi[k], b)
+                if sense == '=' or v < 0:
+                    lo[k] = max(lo[k], b)
+            elif row:
+                (eq if sense == '=' else ub).append((row, rhs))
+            elif (sense == '=' and abs(rhs) > 1e-9) or rhs < -1e-9:
+                return 'infeasible', None, None
+        if (lo > hi + 1e-9).any():
+            return 'infeasible', None, None
+        if (len(ub) + len(eq)) * n > cell_limit:
+            return 'skipped', None, None
+
+        def matrix(rows):
+            a = np.zeros((len(rows), n))
+            for r, (row, _) in enumerate(rows):
+                for k, v in row.items():
+                    a[r, k] = v
+            return a, np.array([rhs for _, rhs in rows], dtype=float)
+
+        a_ub, b_ub = matrix(ub)
+        a_eq, b_eq = matrix(eq)
+        sign = 1.0 if goal == 'max' else -1.0
+        c = np.zeros(n)
+        for k, v in coefs.items():
+            c[k] = sign * v
+        status, z, value = _simplex(c, a_ub, b_ub, a_eq, b_eq, lo, hi)
+        if status != 'optimal':
+            return status, None, None
+        return status, z, sign * value + const
+
+    def value(self, e, z):
+        # the value of a term at the solution z, None when the term is not
+        # linear or has a column the solve did not see
+        f = self.form(e)
+        if f == None or any(k >= len(z) for k in f[0]):
+            return None
+        coefs, const = f
+        return const + sum(v * z[k] for k, v in coefs.items())
+
+
 class _Objective:
+    __slots__ = ('goal', 'type', 'index')
+
     def __init__(self, obj, verbose=False):
 
         if 'goal' not in obj:
@@ -50,6 +1215,8 @@ class _Objective:
         self.index = obj['index']
 
 class _Parameter:
+    __slots__ = ('type', 'name', 'range', 'index', 'value')
+
     def __init__(self, obj, verbose=False):
         if 'type' not in obj:
             if verbose:
@@ -79,6 +1246,8 @@ class _Parameter:
 
 
 class _Variable:
+    __slots__ = ('count', 'type')
+
     def __init__(self, obj, verbose=False):
         if 'length' not in obj:
             raise Exception('Need length in variable as \'length\'')
@@ -96,7 +1265,12 @@ class _Variable:
 
 
 class _Constraint:
-    def __init__(self, obj, upbound, numvar, dep=1, verbose=False):
+    __slots__ = ('term', 'upbound', 'numvar', 'loopvar', 'path', 'outer', 'comp', 'rval',
+        'index', 'type', 'range', 'code_term', 'code_rval', 'code_range', 'code_list',
+        'prefix', 'affine', 'domain')
+    _code = ('code_term', 'code_rval', 'code_range', 'code_list')
+
+    def __init__(self, obj, upbound, numvar, dep=1, verbose=False, path='0', outer=()):
         if 'term' not in obj:
             raise Exception('Need term in constraint as \'term\'')
         self.term = obj['term']
@@ -104,6 +1278,10 @@ class _Constraint:
         self.upbound = upbound
         self.numvar = numvar
         self.loopvar = None
+        self.range = None
+        # position in the constraint tree and the loop variables of enclosing loops
+        self.path = path
+        self.outer = outer
 
         self.comp = obj['comp'] if 'comp' in obj else None
         self.rval = obj['rval'] if 'rval' in obj else None
@@ -139,13 +1317,91 @@ class _Constraint:
                 self.loopvar = obj['loopvar']
         
         if self.type in ('loop', 'or', 'and'):
+            inner = outer + (self.loopvar,) if self.loopvar else outer
             if isinstance(self.term, dict):
                 self.term = [_Constraint(self.term, \
-                    self.loopvar or upbound, numvar, dep+1, verbose)]
+                    self.loopvar or upbound, numvar, dep+1, verbose,
+                    '{}.0'.format(path), inner)]
             elif isinstance(self.term, list):
                 self.term = [_Constraint(t, \
-                    self.loopvar or upbound, numvar, dep+1, verbose) for t in self.term]
+                    self.loopvar or upbound, numvar, dep+1, verbose,
+                    '{}.{}'.format(path, k), inner) for k,t in enumerate(self.term)]
+
+        self._compile()
+
+    def names(self):
+        # every name this constraint and its children refer to
+        names = set()
+        for code in (self.code_term, self.code_rval, self.code_list):
+            names |= _names(code)
+        if self.code_range:
+            names |= _names(self.code_range[0]) | _names(self.code_range[1])
+        if isinstance(self.term, list):
+            for t in self.term:
+                names |= t.names()
+        return names
+
+    def _compile(self):
+        # cache code objects for every expression, so solving only evaluates them
+        self.code_term = _compile(self.term) if isinstance(self.term, str) else None
+        self.code_rval = _compile(self.rval)
+        self.code_range = None
+        self.code_list = None
+        self.prefix = False
+        self.affine = None
+        if self.type in ('loop', 'sum', 'product'):
+            self.code_range = (_compile(self.range[0]), _compile(self.range[1]))
+        if self.type in ('sum', 'product'):
+            self.code_list = _compile('[{} for {} in range({},{}+1)]'.format(
+                self.term, self.loopvar, self.range[0], self.range[1]))
+        if self.type == 'sum':
+            # a sum whose window moves with an enclosing loop variable, while its
+            # term does not, can be read off a shared prefix array
+            outer = set(self.outer)
+            window = _names(self.code_range[0]) | _names(self.code_range[1])
+            self.prefix = bool(window & outer) and not (_names(self.code_term) & outer)
+            self.affine = _affine(self.term, self.loopvar)
+        self.domain = self._domain()
+
+    def _is_var(self, term, loopvar):
+        return isinstance(term, str) and loopvar != None and \
+            re.fullmatch(r'\s*x\s*\[\s*{}\s*\]\s*'.format(re.escape(loopvar)), term) != None
+
+    def _domain(self):
+        # loops that only restrict x[i] to constants, found for the presolve:
+        # ('bound', comp, value) for 'x[i] comp value' and ('set', values) for
+        # an 'or' of 'x[i] = value'
+        if self.type != 'loop':
+            return None
+        if isinstance(self.term, str):
+            value = _constant(self.rval) if self.rval != None else None
+            if self._is_var(self.term, self.loopvar) and self.comp in _comp_func and value != None:
+                return ('bound', self.comp, value)
+            return None
+        if len(self.term) != 1 or self.term[0].type != 'or':
+            return None
+        values = []
+        for t in self.term[0].term:
+            value = _constant(t.rval) if t.rval != None else None
+            if t.type != 'single' or t.comp != '=' or value == None or \
+                    not self._is_var(t.term, self.loopvar):
+                return None
+            values.append(value)
+        return ('set', values)
     
+    # code objects do not pickle, so they travel marshalled and are not
+    # compiled again; marshal data only loads on the same Python version
+    def __getstate__(self):
+        state = {k: getattr(self, k) for k in self.__slots__ if k not in self._code}
+        state['code'] = marshal.dumps(tuple(getattr(self, k) for k in self._code))
+        return state
+
+    def __setstate__(self, state):
+        for k, v in zip(self._code, marshal.loads(state.pop('code'))):
+            setattr(self, k, v)
+        for k, v in state.items():
+            setattr(self, k, v)
+
     def _print(self, level=0):
         padding = '\t' * level
         print(padding, 'This is a constraint of type {}:'.format(self.type), sep='')
@@ -177,6 +1433,8 @@ class _Constraint:
 
 
 class _Input:
+    __slots__ = ('name', 'type', 'length', 'comment')
+
     def __init__(self, obj, verbose=False):
         if 'name' not in obj:
             raise Exception('Need name in input as \'name\'')
@@ -195,6 +1453,7 @@ class _Input:
             if self.type not in ('int', 'real', 'intarray', 'realarray'):
                 raise Exception('Illegal input type.')
             
+        self.length = None
         if self.type in ('intarray', 'realarray'):
             if 'length' not in obj:
                 raise Exception('Need length in input as \'length\'')
@@ -207,6 +1466,136 @@ class _Input:
 
 
 
+# state of a solve_many worker process: the model is unpickled once per worker
+_worker_model = None
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+def _solve_worker(input_, kwargs):
+    try:
+        result, _, specs = _worker_model.solve(input_=input_, **kwargs)
+    except Exception as e:
+        return input_, None, {'status': 'error', 'reason': str(e)}
+    return input_, _to_python(result), specs
+
+
+def _variant_worker(goal, values, input_, kwargs):
+    variant = _worker_model._variant(goal, values)
+    result, _, specs = variant.solve(input_=input_, **kwargs)
+    return variant.problem_text, {p.name: p.value for p in variant.param}, _to_python(result)
+
+
+def _count_worker(value_dict, cubes, limit, timeout, kwargs):
+    # one solver for all the cubes, each one enumerated inside push/pop
+    specs = {}
+    s, x = _worker_model._solver(value_dict, specs, **kwargs)
+    deadline = None if timeout == None else time.time() + timeout
+    count = 0
+    for cube in cubes:
+        s.push()
+        s.add([x[i] == v for i, v in cube])
+        left = None if limit == None else limit - count
+        for _ in ProblemModel._enumerate(s, x, left, deadline, specs):
+            count += 1
+        s.pop()
+        if specs['status'] != 'complete':
+            break
+    return count, specs['status']
+
+
+# a shard of a build is worth its process from this many loop iterations on
+_shard_min = 500
+
+def _shard_worker(value_dict, encoded, pieces, seeds, options):
+    return _worker_model._shard(value_dict, encoded, pieces, seeds, **options)
+
+
+# configurations raced by solve(portfolio=...)
+_portfolio_configs = ('optimize', 'binary', 'seed', 'tactic')
+
+# seconds between checks for portfolio workers that died without a result
+_portfolio_poll = 0.1
+
+def _portfolio_worker(model, value_dict, config, kwargs, results):
+    try:
+        result, assignment, specs = model._solve_config(value_dict, config, **kwargs)
+        results.put((config, _to_python(result), assignment, specs))
+    except Exception as e:
+        results.put((config, None, None, {'status': 'error', 'reason': str(e)}))
+
+
+class _Session:
+    # keeps one solver alive for a fixed input: constraints that do not
+    # mention any parameter are asserted once, the others are re-asserted
+    # inside a push/pop scope for every set of parameter values
+    def __init__(self, model, input_=None, verbose=False, prefix_sum='shared',
+            timeout=None, max_memory=None, vectorize=True, dedupe=True):
+        self.model = model
+        self.verbose = verbose
+        self.prefix_sum = prefix_sum
+        self.affine = {} if vectorize else None
+        self.dedupe = dedupe
+        self.values = model._values(input_=input_)
+
+        names = set(p.name for p in model.param)
+        if _names(_compile(model.variable.count)) & names:
+            raise Exception('Variable length cannot depend on a parameter')
+        self.fixed = [c for c in model.constraint if not (c.names() & names)]
+        self.varying = [c for c in model.constraint if c.names() & names]
+
+        self.opt, self.x, self.y = model._declare(self.values)
+        ProblemModel._limit(self.opt, timeout)
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.specs = {'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0,
+            'n_duplicate': 0}
+        ProblemModel._build(self.fixed, dict(self.values), self.x, self.y, self.opt,
+            self.specs, verbose=verbose, prefix=ProblemModel._prefix_state(prefix_sum),
+            affine=self.affine, dedupe=dedupe)
+
+        self.h = None
+        if model.objective.goal == 'max':
+            self.h = self.opt.maximize(self.y)
+        elif model.objective.goal == 'min':
+            self.h = self.opt.minimize(self.y)
+
+    def solve(self, **params):
+        value_dict = dict(self.values)
+        names = [p.name for p in self.model.param]
+        for name, value in params.items():
+            if name not in names:
+                raise Exception('Cannot find parameter {}'.format(name))
+            value_dict[name] = value
+
+        specs = {'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0,
+            'n_duplicate': 0}
+        self.opt.push()
+        try:
+            ProblemModel._build(self.varying, value_dict, self.x, self.y, self.opt, specs,
+                verbose=self.verbose, prefix=ProblemModel._prefix_state(self.prefix_sum),
+                affine=self.affine, dedupe=self.dedupe)
+            now = time.time()
+            deadline = None if self.timeout == None else now + self.timeout
+            with _memory_limit(self.max_memory):
+                result, model = self.model._optimize(self.opt, self.y, self.h, specs, deadline)
+            specs['time_solve'] = time.time() - now
+        finally:
+            self.opt.pop()
+        return result, model, specs
+
+    def sweep(self, name):
+        # solve for every value in the range of one parameter
+        params = [p for p in self.model.param if p.name == name]
+        if len(params) == 0:
+            raise Exception('Cannot find parameter {}'.format(name))
+        lo, hi = params[0].range
+        for value in range(lo, hi+1):
+            result, model, specs = self.solve(**{name: value})
+            yield value, result, model, specs
+
+
 class ProblemModel:
     def __init__(self, file_path=None, encoding='utf-8', verbose=False):
         self.json = None
@@ -251,8 +1640,8 @@ class ProblemModel:
             self.constraint = []
             Obj = js['constraint']
             if isinstance(Obj, list):
-                for obj in Obj:
-                    self.constraint.append(_Constraint(obj, self.variable.count, self.variable.count,1,self.verbose))
+                for k,obj in enumerate(Obj):
+                    self.constraint.append(_Constraint(obj, self.variable.count, self.variable.count,1,self.verbose,str(k)))
             elif isinstance(Obj, dict):
                 self.constraint.append(_Constraint(Obj, self.variable.count, self.variable.count, 1, self.verbose))
         
@@ -269,12 +1658,150 @@ class ProblemModel:
             elif isinstance(Obj, dict):
                 self.param.append(_Parameter(Obj, self.verbose))
     
+    def validate(self):
+        # structural checks that need neither z3 nor input values: the schema,
+        # the names of inputs and parameters, the scope of loop variables and
+        # the names every expression uses. Returns a list of messages, empty
+        # when the problem is well formed
+        errors = []
+        known = set()
+        reserved = ('x', 'y', 'And', 'Or', 'If')
+
+        for i in self.input:
+            where = 'Input {}'.format(i.name)
+            if not isinstance(i.name, str) or not i.name.isidentifier():
+                errors.append('{}: name is not an identifier'.format(where))
+            elif i.name in known:
+                errors.append('{}: duplicate input name'.format(where))
+            if i.type in ('intarray', 'realarray'):
+                try:
+                    missing = _free_names(_compile(i.length)) - known - _builtin_names
+                except Exception as e:
+                    missing = ()
+                    errors.append('{}: {}'.format(where, e))
+                if missing:
+                    errors.append('{}: length uses {}, which is not an earlier input'.format(
+                        where, ', '.join(sorted(missing))))
+            known.add(i.name)
+
+        for p in self.param:
+            where = 'Parameter {}'.format(p.name)
+            if not isinstance(p.name, str) or not p.name.isidentifier() or p.name in reserved:
+                errors.append('{}: illegal name'.format(where))
+            elif p.name in known:
+                errors.append('{}: name already exists'.format(where))
+            if not (isinstance(p.range, list) and len(p.range) == 2 and
+                    all(isinstance(v, (int, float)) for v in p.range)):
+                errors.append('{}: range needs to be [low, high]'.format(where))
+            elif not p.range[0] <= p.value <= p.range[1]:
+                errors.append('{}: value {} is out of range {}'.format(where, p.value, p.range))
+            known.add(p.name)
+
+        try:
+            missing = _free_names(_compile(self.variable.count)) - known - _builtin_names
+        except Exception as e:
+            missing = ()
+            errors.append('Variable: {}'.format(e))
+        if missing:
+            errors.append('Variable: length uses unknown name{} {}'.format(
+                's' if len(missing) > 1 else '', ', '.join(sorted(missing))))
+
+        index = self.objective.index
+        if not (isinstance(index, list) and len(index) == 2 and all(isinstance(v, int) for v in index)):
+            errors.append('Objective: index needs to be [start, end]')
+
+        if self.constraint == None:
+            errors.append('Need constraint as \'constraint\'')
+        else:
+            for con in self.constraint:
+                ProblemModel._validate(con, known | set(reserved), errors)
+        return errors
+
+    @staticmethod
+    def _validate(con, scope, errors):
+        where = 'Constraint {}'.format(con.path)
+
+        def check(code, names, what):
+            missing = _free_names(code) - names - _builtin_names
+            if missing:
+                errors.append('{}: unknown name{} {} in {}'.format(where,
+                    's' if len(missing) > 1 else '', ', '.join(sorted(missing)), what))
+
+        if con.comp != None and con.comp not in _comp_func:
+            errors.append('{}: illegal comparison operator {}'.format(where, con.comp))
+        if (con.comp == None) != (con.rval == None) and isinstance(con.term, str):
+            errors.append('{}: needs both comp and rval, or neither'.format(where))
+
+        inner = scope
+        if con.type in ('loop', 'sum', 'product'):
+            if not isinstance(con.loopvar, str) or not con.loopvar.isidentifier():
+                errors.append('{}: loop variable {} is not an identifier'.format(where, con.loopvar))
+            elif con.loopvar in scope:
+                errors.append('{}: loop variable {} shadows a name in scope'.format(where, con.loopvar))
+            # the range is evaluated before the loop variable is set
+            for code in con.code_range:
+                check(code, scope, 'range')
+                if _free_names(code) & {'x', 'y'}:
+                    errors.append('{}: range depends on x or y'.format(where))
+            lo, hi = _constant(con.range[0]), _constant(con.range[1])
+            if lo != None and hi != None and lo > hi:
+                errors.append('{}: range [{}, {}] is empty'.format(where, lo, hi))
+            inner = scope | {con.loopvar}
+
+        if con.type in ('single', 'sum', 'product') and not isinstance(con.term, str):
+            errors.append('{}: term of a {} needs to be an expression'.format(where, con.type))
+        elif con.type in ('or', 'and') and not isinstance(con.term, list):
+            errors.append('{}: term of an {} needs to be constraints'.format(where, con.type))
+        elif isinstance(con.term, str):
+            check(con.code_term, inner, 'term')
+            # the rval of a sum or product is compared outside of its loop
+            check(con.code_rval, scope if con.type in ('sum', 'product') else inner, 'rval')
+        elif len(con.term) == 0:
+            errors.append('{}: empty list of constraints'.format(where))
+        else:
+            for t in con.term:
+                ProblemModel._validate(t, inner, errors)
+
+    def check_assignment(self, inputs, x_values, y=None, params=None, tolerance=1e-9):
+        # evaluates every constraint on the given x and y without z3. inputs is
+        # an input file or a dict of input values as for solve. Returns a list
+        # of messages, one per failing constraint with the number of loop
+        # bindings it fails for, empty when the assignment is feasible; whether
+        # y is optimal is not checked. tolerance is relative and only used when
+        # the variables, the goal or an input is real
+        value_dict = self._values(input_=inputs, params=params)
+        n = ProblemModel._get_number(self.variable.count, value_dict)
+        x_values = x_values.tolist() if hasattr(x_values, 'tolist') else list(x_values)
+        if len(x_values) != n:
+            raise Exception('Assignment length mismatch: {} != {}'.format(len(x_values), n))
+        return self._check_values(value_dict, x_values, y, tolerance)
+
+    def _check_values(self, value_dict, x_values, y, tolerance=1e-9):
+        # check_assignment on the values of solve; value_dict is not changed
+        value_dict = {k: v for k, v in value_dict.items() if k != '__builtins__'}
+        errors = []
+        if self.variable.type == 'int':
+            errors += ['x[{}] = {} is not an int'.format(i, v) for i, v in enumerate(x_values)
+                if v != int(v)][:3]
+        if self.objective.type == 'int' and y != None and not isinstance(y, bool) and y != int(y):
+            errors.append('y = {} is not an int'.format(y))
+
+        real = 'real' in (self.variable.type, self.objective.type) or \
+            any(i.type in ('real', 'realarray') for i in self.input)
+        value_dict['x'] = x_values
+        value_dict['y'] = y
+        checker = _Checker(value_dict, tolerance if real else 0)
+        val = dict(checker.values)
+        for con in self.constraint:
+            checker.check(con, val)
+        return errors + checker.messages()
+
     @staticmethod
     def _get_number(i,val_dict):
 
         if isinstance(i, int) or isinstance(i, float):
             return i
-        elif isinstance(i, str):
+        elif isinstance(i, (str, types.CodeType)):
             try:
                 return eval(i, val_dict)
             except:
@@ -283,44 +1810,175 @@ class ProblemModel:
             raise Exception('Illegal type: {}'.format(type(i)))
     
     @staticmethod
-    def _parse_constraint(con, _val, x, y, opt, retList=None, verbose=False, specs=None):
+    def _prefix_sum(con, _val, opt, prefix, specs):
+        # prefix[key] = (start, s, name) where s[k] is the sum of the term over
+        # [start, start+k-1]; every window [l, u] is then s[u+1-start] - s[l-start].
+        # s[k] is either the shared term s[k-1] + t, or in 'aux' mode a fresh
+        # variable constrained to be equal to it
+        lbound = ProblemModel._get_number(con.code_range[0], _val)
+        ubound = ProblemModel._get_number(con.code_range[1], _val)
+        if ubound < lbound:
+            return 0
+
+        key = (con.loopvar, con.term)
+        if key not in prefix:
+            prefix[key] = (lbound, [0], con.path)
+        start, s, name = prefix[key]
+        if lbound < start:
+            # the window moved before the first one seen, expand it naively
+            return None
+
+        saved = _val.get(con.loopvar)
+        for k in range(start+len(s)-1, ubound+1):
+            _val[con.loopvar] = k
+            total = s[-1] + eval(con.code_term, _val)
+            specs['n_unit'] += 1
+            specs['n_prefix'] += 1
+            if prefix['aux'] and z3.is_expr(total):
+                aux = z3.Const('s{}_{}'.format(name, len(s)), total.sort())
+                opt.add(aux == total)
+                specs['n_constraint'] += 1
+                total = aux
+            s.append(total)
+        if saved is None:
+            _val.pop(con.loopvar, None)
+        else:
+            _val[con.loopvar] = saved
+
+        specs['n_unit'] += 1
+        if lbound == start:
+            return s[ubound+1-start]
+        return s[ubound+1-start] - s[lbound-start]
+
+    @staticmethod
+    def _affine_sum(con, _val, x, affine, specs):
+        # a sum of c[i]*x[i] built from the coefficient vector instead of one
+        # eval per element: zero coefficients are dropped, x[i] the presolve
+        # fixed are folded into a constant. affine maps the x[i] the presolve
+        # encoded to (b, lo, hi), b is None for a constant. Returns (term, final):
+        # final is a PbEq/PbLe/PbGe when every x[i] is encoded and rval is a
+        # constant int, (None, None) asks for the naive expansion
+        lbound = ProblemModel._get_number(con.code_range[0], _val)
+        ubound = ProblemModel._get_number(con.code_range[1], _val)
+        if ubound < lbound:
+            return None, None
+        if lbound < 0 or ubound >= len(x):
+            return None, None
+
+        kind, c = con.affine
+        if kind == 'array':
+            coefs = _val.get(c)
+            if not hasattr(coefs, '__len__') or ubound >= len(coefs):
+                return None, None
+            coefs = coefs[lbound:ubound+1]
+        else:
+            c = _val.get(c) if kind == 'scalar' else c
+            if not isinstance(c, (int, float)) or isinstance(c, bool):
+                return None, None
+            coefs = [c] * (ubound - lbound + 1)
+
+        if np != None:
+            coefs = np.asarray(coefs)
+            if coefs.dtype.kind not in 'iuf':
+                return None, None
+            nonzero = np.flatnonzero(coefs)
+            coefs = coefs[nonzero].tolist()
+            indices = (nonzero + lbound).tolist()
+        else:
+            indices = [lbound + k for k, v in enumerate(coefs) if v != 0]
+            coefs = [v for v in coefs if v != 0]
+        specs['n_unit'] += ubound - lbound + 1
+        specs['n_affine'] += 1
+
+        # fixed sums the x[i] the presolve fixed, low the low values of the
+        # Bool-encoded ones, whose pairs carry only the step to their high value
+        fixed, low, kept, terms, pairs = 0, 0, [], [], []
+        for i, v in zip(indices, coefs):
+            if i in affine:
+                b, lo, hi = affine[i]
+                if b is None:
+                    fixed += v * lo
+                    continue
+                low += v * lo
+                if pairs != None:
+                    pairs.append((b, v * (hi - lo)))
+            else:
+                pairs = None
+            kept.append(v)
+            terms.append(x[i])
+
+        if pairs and con.comp in _comp_func and con.rval != None:
+            rval = _evaluate(con.code_rval, _val)
+            k = rval - fixed - low if isinstance(rval, (int, float)) else None
+            if isinstance(k, int) and not isinstance(rval, bool) and \
+                    all(isinstance(w, int) for _, w in pairs):
+                if con.comp == '=':
+                    return None, z3.PbEq(pairs, k)
+                if con.comp in ('<=', '<'):
+                    return None, z3.PbLe(pairs, k - 1 if con.comp == '<' else k)
+                return None, z3.PbGe(pairs, k + 1 if con.comp == '>' else k)
+
+        if len(terms) == 0:
+            return fixed, None
+        if isinstance(fixed, int) and all(isinstance(v, int) for v in kept) and \
+                z3.is_expr(terms[0]) and terms[0].is_int():
+            if fixed != 0:
+                kept.append(1)
+                terms.append(z3.IntVal(fixed, terms[0].ctx))
+            return _linear(kept, terms), None
+        terms = [t if v == 1 else v * t for v, t in zip(kept, terms)]
+        if fixed != 0:
+            terms.append(fixed)
+        return z3.Sum(terms), None
+
+    @staticmethod
+    def _parse_constraint(con, _val, x, y, opt, retList=None, verbose=False, specs=None, prefix=None,
+            affine=None, profile=None, intern=None):
+        if profile != None:
+            # the profile calls back with its own opt and retList to see what
+            # this constraint emits
+            if profile.active is not con:
+                return profile.run(con, opt, retList, lambda opt, retList:
+                    ProblemModel._parse_constraint(con, _val, x, y, opt, retList, verbose,
+                        specs, prefix, affine, profile, intern))
+            profile.active = None
         
         _val['x'] = x
         _val['y'] = y
-        _val['Or'] = Or
-        _val['And'] = And
-        _val['If'] = If
-        
-        comp_func = {
-            '<': lambda x,y: x<y,
-            '<=': lambda x,y: x<=y,
-            '>': lambda x,y: x>y,
-            '>=': lambda x,y: x>=y,
-            '=': lambda x,y: x==y,
-        }
+        _val['Or'] = z3.Or
+        _val['And'] = z3.And
+        _val['If'] = z3.If
+
         def get_comp(comp):
-            if comp in comp_func:
-                return comp_func[comp]
+            if comp in _comp_func:
+                return _comp_func[comp]
             else:
                 raise Exception('Illegal comparison operator: {}'.format(comp))
 
         if con.type in ('single', 'sum', 'product'):
+            term, final = None, None
             if con.type == 'single':
-                term = con.term
+                term = eval(con.code_term, _val)
                 specs['n_unit'] += 1
-            else:
-                term = '[{} for {} in range({},{}+1)]'.format(
-                    con.term, con.loopvar, con.range[0], con.range[1])
-            term = eval(term, _val)
-            if con.type == 'sum':
+            elif con.prefix and prefix != None:
+                term = ProblemModel._prefix_sum(con, _val, opt, prefix, specs)
+            if term is None and con.affine and affine != None:
+                term, final = ProblemModel._affine_sum(con, _val, x, affine, specs)
+            if term is not None or final is not None:
+                pass
+            elif con.type == 'sum':
+                term = eval(con.code_list, _val)
                 specs['n_unit'] += len(term)
-                term = Sum(term)
+                term = z3.Sum(term)
             elif con.type == 'product':
+                term = eval(con.code_list, _val)
                 specs['n_unit'] += len(term)
-                term = Product(term)
+                term = z3.Product(term)
             
-            if con.comp!=None and con.rval!=None:
-                rval = eval(con.rval, _val) if isinstance(con.rval, str) else con.rval
+            if final is not None:
+                pass
+            elif con.comp!=None and con.rval!=None:
+                rval = _evaluate(con.code_rval, _val)
                 final = get_comp(con.comp)(term, rval)
             else:
                 final = term
@@ -328,15 +1986,30 @@ class ProblemModel:
             if retList != None:
                 retList.append(final)
             else:
-                opt.add(final)
-                if specs != None:
-                    specs['n_constraint'] += 1
+                ProblemModel._assert(opt, [final], specs, intern)
                 if verbose:
                     print('Adding constraint:', final)
         
+        elif con.type == 'loop' and affine != None and con.domain != None and \
+                con.domain[0] == 'bound' and con.loopvar not in _val:
+            # x[i] comp constant needs no eval per element
+            lbound = ProblemModel._get_number(con.code_range[0], _val)
+            ubound = ProblemModel._get_number(con.code_range[1], _val)
+            _, comp, value = con.domain
+            comp = get_comp(comp)
+            finals = [comp(x[i], value) for i in range(lbound, ubound+1)]
+            specs['n_unit'] += len(finals)
+            if retList != None:
+                retList.extend(finals)
+            else:
+                ProblemModel._assert(opt, finals, specs, intern)
+                if verbose:
+                    for final in finals:
+                        print('Adding constraint:', final)
+
         elif con.type == 'loop':
-            lbound = ProblemModel._get_number(con.range[0], _val)
-            ubound = ProblemModel._get_number(con.range[1], _val)
+            lbound = ProblemModel._get_number(con.code_range[0], _val)
+            ubound = ProblemModel._get_number(con.code_range[1], _val)
             
             if con.loopvar in _val:
                 raise Exception('Loop variable {} already exists.'.format(con.loopvar))
@@ -344,11 +2017,11 @@ class ProblemModel:
             for i in range(lbound, ubound+1):
                 _val[con.loopvar] = i
                 if isinstance(con.term, str):
-                    term = eval(con.term, _val)
+                    term = eval(con.code_term, _val)
                     specs['n_unit'] += 1
 
                     if con.comp!=None and con.rval!=None:
-                        rval = eval(con.rval, _val) if isinstance(con.rval, str) else con.rval
+                        rval = _evaluate(con.code_rval, _val)
                         final = get_comp(con.comp)(term, rval)
                     else:
                         final = term
@@ -356,43 +2029,56 @@ class ProblemModel:
                     if retList != None:
                         retList.append(final)
                     else:
-                        opt.add(final)
-                        if specs != None:
-                            specs['n_constraint'] += 1
+                        ProblemModel._assert(opt, [final], specs, intern)
                         if verbose:
                             print('Adding constraint:', final)
                 else:
                     for cons in con.term:
                         ProblemModel._parse_constraint(cons, _val, x, y, 
-                            opt, retList, verbose=verbose, specs=specs)
+                            opt, retList, verbose=verbose, specs=specs, prefix=prefix, affine=affine,
+                            profile=profile, intern=intern)
             
-            del _val[con.loopvar]
+            _val.pop(con.loopvar, None)
         
         elif con.type == 'or' or con.type == 'and':
             condList = []
             for cons in con.term:
                 ProblemModel._parse_constraint(cons, _val, x, y, 
-                    opt, condList, verbose=verbose, specs=specs)
-            if specs != None:
-                specs['n_constraint'] += len(condList)
+                    opt, condList, verbose=verbose, specs=specs, prefix=prefix, affine=affine,
+                    profile=profile, intern=intern)
+            if intern != None:
+                condList = intern.unique(condList)
             if len(condList) == 1:
                 final = condList[0]
             else:
                 if con.type == 'or':
-                    final = Or(condList)
+                    final = z3.Or(condList)
                 else:
-                    final = And(condList)
+                    final = z3.And(condList)
             if retList != None:
+                # n_constraint counts the operands; the parent counts this one
                 retList.append(final)
-                specs['n_constraint'] -= 1
+                if specs != None:
+                    specs['n_constraint'] += len(condList) - 1
             else:
-                opt.add(final)
+                ProblemModel._assert(opt, [final], specs, intern, weight=len(condList))
                 if verbose:
                     print('Adding constraint:', final)
         
         else:
             raise Exception('Illegal constraint type: {}'.format(con.type))
 
+    @staticmethod
+    def _assert(opt, finals, specs, intern=None, weight=1):
+        # asserts finals, each weight atoms of n_constraint; with intern the
+        # ones asserted before are dropped and counted as n_duplicate instead
+        if specs != None:
+            if intern != None:
+                intern.count(finals, weight)
+            else:
+                specs['n_constraint'] += len(finals) * weight
+        opt.add(finals)
+
     @staticmethod
     def get_article(word):
         if word[0] in ('a','e','i','o','u'):
@@ -401,55 +2087,132 @@ class ProblemModel:
             return 'a'
 
     def _input(self, input_=None):
+        if isinstance(input_, dict):
+            return self._input_values(input_)
+        if input_ != None and input_.endswith('.npz'):
+            return self._input_npz(input_)
+
         input_dict = {}
 
-        inputs = None
+        # a file is read as a stream of whitespace separated tokens, so arrays
+        # may span several lines; an array may also be given as @file.npy
+        tokens = None
+        f, buf = None, None
         if input_ != None:
-            with open(input_, "r") as f:
-                inputs = f.readlines()
-
-        for idx,i in enumerate(self.input):
-            if i.name in input_dict:
-                raise Exception('Duplicate input name: {}'.format(i.name))
-
-            if i.type in ('int', 'real'):
-                if inputs == None:
-                    print('Input {}, {} {} number{}: '.format(
-                    i.name, ProblemModel.get_article(i.type), i.type,
-                    ', '+i.comment if i.comment else ''), end='')
-                tp = int if i.type == 'int' else float
-                try:
-                    if inputs != None:
-                        input_dict[i.name] = tp(inputs[idx])
-                    else:
-                        input_dict[i.name] = tp(input())
-                except ValueError:
-                    raise Exception('Illegal input')
-                
-            
-            elif i.type in ('intarray', 'realarray'):
-                tp = int if i.type == 'intarray' else float
-
-                length = ProblemModel._get_number(i.length, input_dict)
-                
-                if inputs == None:
-                    print('Input {}, {} {} of length {}{}: '.format(
-                    i.name, ProblemModel.get_article(i.type), i.type, length,
-                    ', '+i.comment if i.comment else ''), end='')
-                try:
-                    if inputs != None:
-                        input_dict[i.name] = [tp(x) for x in inputs[idx].split()]
-                    else:
-                        input_dict[i.name] = [tp(v) for v in input().split()]
-                except ValueError:
-                    raise Exception('Illegal input')
-                
-                if len(input_dict[i.name]) != length:
-                    raise Exception('Input length mismatch: {} != {}'.format(len(input_dict[i.name]), length)) 
-            
+            f = open(input_, 'rb')
+            size = os.fstat(f.fileno()).st_size
+            if size > _mmap_threshold:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
             else:
-                raise Exception('Illegal input type: {}'.format(i.type))
-        
+                buf = f.read()
+            tokens = (m.group() for m in _token.finditer(buf))
+
+        try:
+            for i in self.input:
+                if i.name in input_dict:
+                    raise Exception('Duplicate input name: {}'.format(i.name))
+                input_dict[i.name] = self._read_input(i, input_dict, tokens, input_)
+
+            if tokens != None and next(tokens, None) != None:
+                raise Exception('Unexpected trailing input in {}'.format(input_))
+        finally:
+            tokens = None
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+            if f != None:
+                f.close()
+
+        # eval() of the length expressions leaves its builtins behind
+        input_dict.pop('__builtins__', None)
+        return input_dict
+
+    def _read_input(self, i, input_dict, tokens, input_):
+        if i.type in ('int', 'real'):
+            if tokens == None:
+                print('Input {}, {} {} number{}: '.format(
+                i.name, ProblemModel.get_article(i.type), i.type,
+                ', '+i.comment if i.comment else ''), end='')
+            tp = int if i.type == 'int' else float
+            try:
+                if tokens != None:
+                    return tp(next(tokens))
+                else:
+                    return tp(input())
+            except (ValueError, StopIteration):
+                raise Exception('Illegal input')
+
+        elif i.type in ('intarray', 'realarray'):
+            tp = int if i.type == 'intarray' else float
+
+            length = ProblemModel._get_number(i.length, input_dict)
+
+            if tokens == None:
+                print('Input {}, {} {} of length {}{}: '.format(
+                i.name, ProblemModel.get_article(i.type), i.type, length,
+                ', '+i.comment if i.comment else ''), end='')
+            try:
+                if tokens == None:
+                    value = _compact([tp(v) for v in input().split()], tp)
+                else:
+                    # an empty array has no token, the next one is the next input's
+                    first = next(tokens, None) if length > 0 else None
+                    if first != None and first.startswith(b'@'):
+                        path = os.path.join(os.path.dirname(input_), first[1:].decode())
+                        value = _load_npy(path, tp)
+                    else:
+                        rest = itertools.islice(tokens, max(length-1, 0))
+                        head = [] if first == None else [first]
+                        value = _compact(map(tp, itertools.chain(head, rest)), tp)
+            except ValueError:
+                raise Exception('Illegal input')
+
+            if len(value) != length:
+                raise Exception('Input length mismatch: {} != {}'.format(len(value), length))
+            return value
+
+        else:
+            raise Exception('Illegal input type: {}'.format(i.type))
+
+    def _input_npz(self, input_):
+        # every input is stored under its name, scalars as 0-d arrays
+        if np == None:
+            raise Exception('numpy is needed to read {}'.format(input_))
+        input_dict = {}
+        with np.load(input_) as data:
+            for i in self.input:
+                if i.name not in data:
+                    raise Exception('Cannot find input {} in {}'.format(i.name, input_))
+                tp = int if i.type in ('int', 'intarray') else float
+                if i.type in ('int', 'real'):
+                    input_dict[i.name] = tp(data[i.name].item())
+                else:
+                    value = _from_numpy(data[i.name], tp)
+                    length = ProblemModel._get_number(i.length, input_dict)
+                    if len(value) != length:
+                        raise Exception('Input length mismatch: {} != {}'.format(len(value), length))
+                    input_dict[i.name] = value
+        input_dict.pop('__builtins__', None)
+        return input_dict
+
+    def _input_values(self, values):
+        # inputs given as a dict of name -> number or list, e.g. by the server
+        input_dict = {}
+        for i in self.input:
+            if i.name not in values:
+                raise Exception('Cannot find input {}'.format(i.name))
+            tp = int if i.type in ('int', 'intarray') else float
+            try:
+                if i.type in ('int', 'real'):
+                    input_dict[i.name] = tp(values[i.name])
+                    continue
+                value = _compact([tp(v) for v in values[i.name]], tp)
+            except (TypeError, ValueError):
+                raise Exception('Illegal input')
+            length = ProblemModel._get_number(i.length, input_dict)
+            if len(value) != length:
+                raise Exception('Input length mismatch: {} != {}'.format(len(value), length))
+            input_dict[i.name] = value
+        input_dict.pop('__builtins__', None)
         return input_dict
     
     
@@ -478,7 +2241,7 @@ class ProblemModel:
             print('\tBound: {}'.format(c.range))
     
 
-    def solve(self, verbose = False, nosolve=False, input_=None):
+    def _values(self, input_=None, params=None):
         # first, handle input
         value_dict = self._input(input_=input_)
         # then, add parameter
@@ -486,56 +2249,985 @@ class ProblemModel:
             if p.name in value_dict:
                 raise Exception('Name {} already exists.'.format(p.name))
             value_dict[p.name] = p.value
-        
+        if params:
+            for name, value in params.items():
+                if name not in [p.name for p in self.param]:
+                    raise Exception('Cannot find parameter {}'.format(name))
+                value_dict[name] = value
+        return value_dict
 
+    def _declare(self, value_dict):
         # declare optimizer, variable x, and goal y
-        opt = Solver() if self.objective.goal == 'exist' else Optimize()
+        opt = z3.Solver() if self.objective.goal == 'exist' else z3.Optimize()
 
         num_var = ProblemModel._get_number(self.variable.count, value_dict)
         if self.variable.type == 'int':
-            x = IntVector('x', num_var)
+            x = z3.IntVector('x', num_var)
         else:
-            x = RealVector('x', num_var)
+            x = z3.RealVector('x', num_var)
         
         if self.objective.type == 'int':
-            y = Int('y')
+            y = z3.Int('y')
         else:
-            y = Real('y')
+            y = z3.Real('y')
+        return opt, x, y
 
+    @staticmethod
+    def _prefix_state(prefix_sum):
+        # moving-window sums are read off prefix sums: 'shared' reuses one
+        # chain of terms, 'aux' adds a variable per prefix, 'naive' expands
+        # every window in full (O(n^2) atoms)
+        if prefix_sum not in ('shared', 'aux', 'naive'):
+            raise Exception('Illegal prefix sum mode: {}'.format(prefix_sum))
+        return None if prefix_sum == 'naive' else {'aux': prefix_sum == 'aux'}
+
+    @staticmethod
+    def _build(constraints, value_dict, x, y, opt, specs, verbose=False, prefix=None, affine=None,
+            profile=None, dedupe=True):
         # handle constraints
         # need to do a recursive way
-        specs = {'n_constraint': 0, 'n_unit': 0}
         now = time.time()
-        for con in self.constraint:
-            ProblemModel._parse_constraint(con, value_dict, x, y, opt, 
-                retList=None, verbose=verbose, specs=specs)
+        intern = _Intern(opt, specs) if dedupe else None
+        for con in constraints:
+            ProblemModel._parse_constraint(con, value_dict, x, y, intern or opt, 
+                retList=None, verbose=verbose, specs=specs, prefix=prefix, affine=affine,
+                profile=profile, intern=intern)
         specs['time_constraint'] = time.time() - now
 
-        if nosolve:
-            specs['time_solve'] = None
-            return None, None, specs
+    @staticmethod
+    def _prefix_keys(con):
+        # the prefix sums a constraint and its children read, by their key in
+        # the prefix state
+        keys = {(con.loopvar, con.term)} if con.type == 'sum' and con.prefix else set()
+        if isinstance(con.term, list):
+            for t in con.term:
+                keys |= ProblemModel._prefix_keys(t)
+        return keys
+
+    @staticmethod
+    def _piece(con, lo, hi):
+        # the top-level loop con restricted to the iterations [lo, hi]
+        if lo == None:
+            return con
+        piece = copy.copy(con)
+        piece.code_range = (lo, hi)
+        return piece
+
+    def _plan_shards(self, constraints, value_dict, shards):
+        # cut the build into about 4 shards per process, each a run of
+        # (constraint index, lo, hi) pieces in build order; a top-level loop
+        # is split by its iterations, anything else is one piece. Also returns
+        # the constraints that read prefix sums, (index, lo, hi, keys), which
+        # every shard replays to start its prefix state where the serial build does
+        index = {id(c): k for k, c in enumerate(self.constraint)}
+        vals = dict(value_dict)
+        items, seeds = [], []
+        for con in constraints:
+            lo, hi, weight = None, None, 1
+            if con.type in ('loop', 'sum', 'product'):
+                lbound = ProblemModel._get_number(con.code_range[0], vals)
+                ubound = ProblemModel._get_number(con.code_range[1], vals)
+                weight = max(1, ubound - lbound + 1)
+                if con.type == 'loop':
+                    lo, hi = lbound, ubound
+            keys = ProblemModel._prefix_keys(con)
+            if keys:
+                seeds.append((index[id(con)], lo, hi, keys))
+            items.append((index[id(con)], lo, hi, weight))
+        target = max(_shard_min, sum(w for *_, w in items) / (4 * shards))
+
+        chunks, chunk, size = [], [], 0
+        for k, lo, hi, weight in items:
+            if lo == None or weight <= target:
+                parts = [(lo, hi, weight)]
+            else:
+                step = int(target)
+                parts = [(i, min(i + step - 1, hi), min(step, hi - i + 1))
+                    for i in range(lo, hi + 1, step)]
+            for lo, hi, w in parts:
+                chunk.append((k, lo, hi))
+                size += w
+                if size >= target:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+        if chunk:
+            chunks.append(chunk)
+        return chunks, seeds
+
+    def _shard(self, value_dict, encoded, pieces, seeds, prefix_sum='shared', vectorize=True,
+            dedupe=True, verbose=False):
+        # build pieces in a worker process. x is made again from the presolve
+        # encoding {i: (Bool name or None, lo, hi)}, and the assertions go back
+        # through _encode with the counters of the build
+        value_dict = dict(value_dict)
+        _, x, y = self._declare(value_dict)
+        affine = {}
+        for i, (name, lo, hi) in encoded.items():
+            b = None if name == None else z3.Bool(name)
+            x[i] = z3.IntVal(lo) if b is None else z3.If(b, hi, lo)
+            affine[i] = (b, lo, hi)
+        affine = affine if vectorize else None
+
+        # a z3.Solver would take milliseconds per assertion on long prefix sums
+        sink = _Recorder()
+        specs = {'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0, 'n_duplicate': 0}
+        prefix = ProblemModel._prefix_state(prefix_sum)
+        intern = _Intern(sink, specs) if dedupe else None
+        for k, lo, hi in pieces:
+            if prefix != None:
+                # the serial build started the shared prefix sums in the first
+                # iterations that read them, so those are replayed, unasserted
+                for s, s_lo, s_hi, keys in seeds:
+                    if s > k or (s == k and (lo == None or lo <= s_lo)) or keys <= set(prefix):
+                        continue
+                    stop = lo if s == k else s_hi + 1
+                    for i in ([None] if s_lo == None else range(s_lo, stop)):
+                        ProblemModel._parse_constraint(
+                            ProblemModel._piece(self.constraint[s], i, i), value_dict, x, y,
+                            _Recorder(), [], specs=dict(specs), prefix=prefix, affine=affine)
+                        if keys <= set(prefix):
+                            break
+            ProblemModel._parse_constraint(ProblemModel._piece(self.constraint[k], lo, hi),
+                value_dict, x, y, intern or sink, retList=None, verbose=verbose, specs=specs,
+                prefix=prefix, affine=affine, intern=intern)
+        nodes, roots = _encode([z3.BoolSort().cast(a) for a in sink.added])
+        weights = [intern.weight(a) for a in sink.added] if intern else [1] * len(roots)
+        return nodes, roots, weights, specs
+
+    def _build_shards(self, constraints, value_dict, x, y, opt, specs, shards, affine,
+            prefix_sum='shared', vectorize=True, dedupe=True, verbose=False):
+        # _build with the constraints expanded by shards processes. The shards
+        # are merged in build order and _decode makes the very terms of the
+        # serial build, so the assertions are the same ones in the same order;
+        # n_unit and n_prefix count the work of the shards, which replay the
+        # start of the prefix sums, and with 'aux' prefix sums n_duplicate also
+        # counts the variables a shard defined again. Too little
+        # work for two shards, and 'aux' without dedupe (which would keep those
+        # definitions), are built serially. Returns False then
+        now = time.time()
+        if prefix_sum == 'aux' and not dedupe:
+            return False
+        chunks, seeds = self._plan_shards(constraints, value_dict, shards)
+        if len(chunks) < 2:
+            return False
+        encoded = {i: (None if b is None else b.decl().name(), lo, hi)
+            for i, (b, lo, hi) in affine.items()}
+        values = {k: v for k, v in value_dict.items()
+            if k not in ('__builtins__', 'x', 'y', 'Or', 'And', 'If')}
+        options = {'prefix_sum': prefix_sum, 'vectorize': vectorize, 'dedupe': dedupe,
+            'verbose': verbose}
 
+        intern = _Intern(opt, specs) if dedupe else None
+        merge = 0.0
+        with _futures.ProcessPoolExecutor(max_workers=min(shards, len(chunks)),
+                initializer=_init_worker, initargs=(self,)) as pool:
+            for nodes, roots, weights, counts in pool.map(_shard_worker,
+                    itertools.repeat(values), itertools.repeat(encoded), chunks,
+                    itertools.repeat(seeds), itertools.repeat(options)):
+                start = time.time()
+                terms = _decode(nodes, roots)
+                for k, v in counts.items():
+                    specs[k] += v
+                if intern != None:
+                    # the shard counted what an earlier one already asserted
+                    for t, w in zip(terms, weights):
+                        if t.get_id() in intern.seen:
+                            specs['n_constraint'] -= w
+                            specs['n_duplicate'] += w
+                (intern or opt).add(terms)
+                merge += time.time() - start
+        specs['n_shard'] = len(chunks)
+        specs['time_merge'] = merge
+        specs['time_constraint'] = time.time() - now
+        return True
+
+    @staticmethod
+    def _limit(opt, timeout=None):
+        # timeout in seconds for every check; the memory limit is not one of
+        # the solver, see _memory_limit
+        if timeout != None:
+            opt.set('timeout', max(1, int(timeout * 1000)))
+
+    def _optimize(self, opt, y, h=None, specs=None, deadline=None):
+        # h is the handle of an objective that was already added to opt, and
+        # deadline the time.time() at which the timeout set on opt runs out.
+        # specs['status'] is optimal, sat (for exist), unsat, timeout or unknown;
+        # when a max/min check stops early the result is the best value found
+        # so far and specs['bound'] the bound z3 has proven on it, None when
+        # z3 has none that is finite and agrees with that value
+        if specs == None:
+            specs = {}
         result, model = None, None
 
-        now = time.time()        
         if self.objective.goal == 'exist':
-            if opt.check() != sat:
+            r = opt.check()
+            if r == z3.sat:
+                result, model = True, opt.model()
+                specs['status'] = 'sat'
+            elif r == z3.unsat:
                 result, model = False, None
+                specs['status'] = 'unsat'
             else:
-                result, model = True, opt.model()
-        else:
+                ProblemModel._unknown(opt, specs, deadline)
+            return result, model
+
+        if h == None:
             h = opt.maximize(y) if self.objective.goal == 'max' else opt.minimize(y)
-            if opt.check() != sat:
-                result, model = False, None
-            if self.objective.goal == 'max':
-                result, model = opt.upper(h), opt.model()
+        r = opt.check()
+        if r == z3.unsat:
+            specs['status'] = 'unsat'
+            specs['optimal'] = False
+            return False, None
+
+        bound = opt.upper(h) if self.objective.goal == 'max' else opt.lower(h)
+        if r == z3.sat:
+            specs['status'] = 'optimal'
+            specs['optimal'] = True
+            return bound, opt.model()
+
+        ProblemModel._unknown(opt, specs, deadline)
+        specs['optimal'] = False
+        specs['bound'] = None
+        # the other side of the objective is the value of the best model found
+        best = opt.lower(h) if self.objective.goal == 'max' else opt.upper(h)
+        try:
+            model = opt.model()
+        except Exception:
+            model = None
+        if model == None or model[y] == None:
+            # no incumbent was found before the limit
+            return None, None
+        if not (z3.is_int_value(best) or z3.is_rational_value(best)):
+            best = model.eval(y, model_completion=True)
+        # a check cut short can leave a bound that the incumbent already beats
+        if (z3.is_int_value(bound) or z3.is_rational_value(bound)) and \
+                (z3.is_int_value(best) or z3.is_rational_value(best)):
+            bound, value = _to_python(bound), _to_python(best)
+            if (bound >= value) if self.objective.goal == 'max' else (bound <= value):
+                specs['bound'] = bound
+        return best, model
+
+    def _bisect(self, s, y, specs, timeout=None):
+        # optimize an integer goal with a plain solver: gallop from the first
+        # model until a bound fails, then bisect between the two
+        deadline = None if timeout == None else time.time() + timeout
+        sign = 1 if self.objective.goal == 'max' else -1
+
+        def check():
+            if deadline != None:
+                s.set('timeout', max(1, int((deadline - time.time()) * 1000)))
+            return s.check()
+
+        r = check()
+        if r == z3.unsat:
+            specs['status'] = 'unsat'
+            specs['optimal'] = False
+            return False, None
+        if r != z3.sat:
+            ProblemModel._unknown(s, specs, deadline)
+            specs['optimal'] = False
+            return None, None
+
+        model = s.model()
+        lo, hi, step = sign * model.eval(y, model_completion=True).as_long(), None, 1
+        while hi == None or hi - lo > 1:
+            target = lo + step if hi == None else (lo + hi) // 2
+            s.push()
+            s.add(sign * y >= target)
+            r = check()
+            if r == z3.sat:
+                model = s.model()
+                lo = sign * model.eval(y, model_completion=True).as_long()
+                step *= 2
+            s.pop()
+            if r == z3.unsat:
+                hi = target
+            elif r != z3.sat:
+                ProblemModel._unknown(s, specs, deadline)
+                specs['optimal'] = False
+                specs['bound'] = None if hi == None else sign * (hi - 1)
+                return sign * lo, model
+
+        specs['status'] = 'optimal'
+        specs['optimal'] = True
+        return sign * lo, model
+
+    def _hint(self, opt, x, y, hint, value_dict, specs, affine=None, timeout=None):
+        # hint is a value of the goal, an assignment {'x': [...], 'y': ...}, or
+        # a callable that returns either from the values of the inputs and
+        # parameters. The x of an assignment are the initial phase of the
+        # solver, and with x fixed a model is found by propagation alone. The
+        # value h is then proven optimal by one unsat check that nothing is
+        # better; without x a second check has to reach h. The checks run on a
+        # plain solver over the same assertions, which proves bounds faster
+        # than Optimize. Returns (result, model), or None after asserting what
+        # the checks learned about y, which keeps the optimum: a better
+        # incumbent, or that h is out of reach
+        now = time.time()
+        if callable(hint):
+            hint = hint(**value_dict)
+        specs['time_hint'] = time.time() - now
+        h = hint.get('y') if isinstance(hint, dict) else hint
+        values = hint.get('x') if isinstance(hint, dict) else None
+        if values != None:
+            if len(values) != len(x):
+                raise Exception('Hint length mismatch: {} != {}'.format(len(values), len(x)))
+            affine = affine or {}
+            for i, v in enumerate(values):
+                if i in affine:
+                    b, lo, hi = affine[i]
+                    if b is not None:
+                        opt.set_initial_value(b, v == hi)
+                elif z3.is_const(x[i]) and x[i].decl().kind() == z3.Z3_OP_UNINTERPRETED:
+                    opt.set_initial_value(x[i], v)
+            if h != None:
+                opt.set_initial_value(y, h)
+        if h == None or self.objective.goal == 'exist':
+            specs['hint'] = 'phase'
+            return None
+
+        now = time.time()
+        deadline = None if timeout == None else now + timeout
+        s = z3.Solver()
+        s.add(opt.assertions())
+
+        def check(*conds):
+            if deadline != None:
+                s.set('timeout', max(1, int((deadline - time.time()) * 1000)))
+            s.push()
+            s.add(*conds)
+            r = s.check()
+            model = s.model() if r == z3.sat else None
+            s.pop()
+            return r, model
+
+        witness = None
+        if values != None:
+            r, witness = check(y == h, *[e == v for e, v in zip(x, values)])
+            specs['hint_assignment'] = 'feasible' if r == z3.sat else 'infeasible'
+
+        result = None
+        r, model = check(y > h if self.objective.goal == 'max' else y < h)
+        if r == z3.sat:
+            # the hint is not optimal, the model is a better incumbent
+            specs['hint'] = 'low' if self.objective.goal == 'max' else 'high'
+            found = model.eval(y, model_completion=True)
+            opt.add(y >= found if self.objective.goal == 'max' else y <= found)
+        elif r == z3.unsat:
+            if witness == None:
+                r, witness = check(y == h)
+            if witness != None:
+                specs['hint'] = 'optimal'
+                specs['status'] = 'optimal'
+                specs['optimal'] = True
+                result = (witness.eval(y, model_completion=True), witness)
+            elif r == z3.unsat:
+                # h cannot be reached, so the optimum is on the other side of it
+                specs['hint'] = 'high' if self.objective.goal == 'max' else 'low'
+                opt.add(y < h if self.objective.goal == 'max' else y > h)
+        if r not in (z3.sat, z3.unsat):
+            specs['hint'] = 'unknown'
+        specs['time_hint_check'] = time.time() - now
+        if result == None and deadline != None:
+            ProblemModel._limit(opt, max(deadline - time.time(), 0.001))
+        return result
+
+    def _baseline(self, assertions, y, specs, timeout=None, max_memory=None):
+        # the effect of a hint: the assertions it was given are solved again
+        # cold, with the same limits. specs['time_baseline'] is the time of
+        # that solve and specs['status_baseline'] its status, which is timeout
+        # when the saving is larger than time_saved says
+        opt = z3.Solver() if self.objective.goal == 'exist' else z3.Optimize()
+        opt.add(assertions)
+        ProblemModel._limit(opt, timeout)
+        cold = {}
+        now = time.time()
+        with _memory_limit(max_memory):
+            self._optimize(opt, y, specs=cold,
+                deadline=None if timeout == None else now + timeout)
+        specs['time_baseline'] = time.time() - now
+        specs['status_baseline'] = cold['status']
+        specs['time_saved'] = specs['time_baseline'] - specs['time_solve']
+
+    def _relax(self, opt, x, y, value_dict, specs):
+        # solves the LP relaxation of the assertions (see _Relaxation) and
+        # asserts its bound on y, which z3 then need not find itself. When the
+        # LP optimum is integral and passes check_assignment, it is the
+        # optimum: returns (result, assignment),
+        # else None. specs['relax'] is integral, bound, unbounded, infeasible
+        # (the assertions are unsat, left for z3 to report) or skipped
+        now = time.time()
+        relaxation = _Relaxation()
+        skipped = 0
+        for e in opt.assertions():
+            skipped += not relaxation.add(e)
+        # x[i] that no assertion mentions still need a column to read back
+        for e in x:
+            relaxation.form(e)
+        goal = self.objective.goal
+        status, z, value = relaxation.solve(y, goal)
+        specs['relax'] = 'bound' if status == 'optimal' else status
+        specs['relax_rows'] = len(relaxation.rows)
+        specs['relax_cols'] = len(relaxation.integral)
+        specs['relax_skipped'] = skipped
+        result = None
+        if status == 'optimal':
+            specs['relax_bound'] = value
+            # the simplex drifts with the size of the values, so the slack
+            # grows with them and the bound never cuts off the optimum
+            slack = 1e-6 * (1 + abs(value))
+            if self.objective.type == 'int':
+                bound = int(np.floor(value + slack) if goal == 'max' else np.ceil(value - slack))
             else:
-                result, model = opt.lower(h), opt.model()
-        
+                bound = value + slack * (1 if goal == 'max' else -1)
+            opt.add(y <= bound if goal == 'max' else y >= bound)
+
+            x_values = [relaxation.value(e, z) for e in x]
+            values = x_values + [value]
+            if None not in values and all(abs(v - round(v)) <= 1e-6 * (1 + abs(v))
+                    for v in values):
+                x_values = [int(round(v)) for v in x_values]
+                value = int(round(value))
+                if not self._check_values(value_dict, x_values, value):
+                    specs['relax'] = 'integral'
+                    specs['status'] = 'optimal'
+                    specs['optimal'] = True
+                    y_value = z3.IntVal(value) if self.objective.type == 'int' else z3.RealVal(value)
+                    result = (y_value, {'x': x_values, 'y': value})
+        specs['time_relax'] = time.time() - now
+        return result
+
+    def _domains(self, value_dict, n):
+        # the bounds lo[i], hi[i] and the value set sets[i] that the constant
+        # loop constraints give every x[i] (None where there is none), and the
+        # (constraint, kind, indices) they came from
+        lo, hi, sets = [None] * n, [None] * n, [None] * n
+        found = []
+        for con in self.constraint:
+            if con.domain == None or self.variable.type != 'int':
+                continue
+            lbound = ProblemModel._get_number(con.code_range[0], value_dict)
+            ubound = ProblemModel._get_number(con.code_range[1], value_dict)
+            indices = range(max(lbound, 0), min(ubound, n-1) + 1)
+            if len(indices) != ubound - lbound + 1:
+                continue
+            kind, *rest = con.domain
+            if kind == 'bound':
+                comp, value = rest
+                if not isinstance(value, int):
+                    continue
+                for i in indices:
+                    if comp in ('>=', '>', '='):
+                        v = value + 1 if comp == '>' else value
+                        lo[i] = v if lo[i] == None else max(lo[i], v)
+                    if comp in ('<=', '<', '='):
+                        v = value - 1 if comp == '<' else value
+                        hi[i] = v if hi[i] == None else min(hi[i], v)
+            else:
+                values = set(rest[0])
+                if not all(isinstance(v, int) for v in values):
+                    continue
+                for i in indices:
+                    sets[i] = values if sets[i] == None else sets[i] & values
+            found.append((con, kind, indices))
+        return lo, hi, sets, found
+
+    def _presolve(self, value_dict, x, specs):
+        # collect the domain of every x[i] from the constant loop constraints and
+        # pick a compact encoding: a constant, a Bool for two values, or a single
+        # bounds assertion for an int. A pair of Bools for {-1,0,1} was tried
+        # and made z3 Optimize far slower on stock_price, so wider domains stay
+        # ints. Returns the new x, the assertions the encoding needs, the
+        # constraints it does not already imply, and {i: (b, lo, hi)} for the
+        # x[i] it encoded, b is None when x[i] is the constant lo
+        now = time.time()
+        n = len(x)
+        lo, hi, sets, found = self._domains(value_dict, n)
+
+        new_x, assertions, affine = list(x), [], {}
+        encoded = [None] * n
+        for i in range(n):
+            values = sets[i]
+            if values == None and lo[i] != None and hi[i] != None and hi[i] - lo[i] <= 1:
+                values = set(range(lo[i], hi[i] + 1))
+            if values != None:
+                values = sorted(v for v in values if (lo[i] == None or v >= lo[i])
+                    and (hi[i] == None or v <= hi[i]))
+                if len(values) == 0:
+                    # infeasible, leave it to the solver
+                    continue
+            if values != None and len(values) == 1:
+                new_x[i] = z3.IntVal(values[0])
+                encoded[i] = 'set'
+                affine[i] = (None, values[0], values[0])
+            elif values != None and len(values) == 2:
+                b = z3.Bool('b__{}'.format(i))
+                new_x[i] = z3.If(b, values[1], values[0])
+                encoded[i] = 'set'
+                affine[i] = (b, values[0], values[1])
+            elif lo[i] != None or hi[i] != None:
+                bounds = [x[i] >= lo[i]] if lo[i] != None else []
+                bounds += [x[i] <= hi[i]] if hi[i] != None else []
+                assertions.append(bounds[0] if len(bounds) == 1 else z3.And(bounds))
+                encoded[i] = 'bound'
+
+        dropped, constraints = 0, []
+        implied = {con: all(encoded[i] == 'set' or (kind == 'bound' and encoded[i] == 'bound')
+            for i in indices) for con, kind, indices in found}
+        for con in self.constraint:
+            if implied.get(con, False):
+                dropped += len([i for c, _, indices in found if c is con for i in indices])
+            else:
+                constraints.append(con)
+
+        specs['presolve_bool'] = len([i for i in range(n) if encoded[i] == 'set'])
+        specs['presolve_bound'] = len([i for i in range(n) if encoded[i] == 'bound'])
+        specs['presolve_dropped'] = dropped
+        specs['presolve_added'] = len(assertions)
+        specs['time_presolve'] = time.time() - now
+        return new_x, assertions, constraints, affine
+
+    def _solve_config(self, value_dict, config, prefix_sum='shared', timeout=None, max_memory=None,
+            presolve=False, vectorize=True, dedupe=True):
+        # one portfolio entry, run in its own process
+        value_dict = dict(value_dict)
+        opt, x, y = self._declare(value_dict)
+        if config in ('binary', 'tactic'):
+            if self.objective.type != 'int':
+                raise Exception('Configuration {} needs an int goal'.format(config))
+            opt = z3.Solver() if config == 'binary' else \
+                z3.Then('simplify', 'propagate-values', 'lia2card', 'smt').solver()
+        elif config == 'seed':
+            opt.set('random_seed', 7)
+        elif config != 'optimize':
+            raise Exception('Illegal portfolio configuration: {}'.format(config))
+
+        specs = {'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0,
+            'n_duplicate': 0}
+        constraints, affine = self.constraint, {}
+        if presolve:
+            x, assertions, constraints, affine = self._presolve(value_dict, x, specs)
+            opt.add(assertions)
+        ProblemModel._build(constraints, value_dict, x, y, opt, specs,
+            prefix=ProblemModel._prefix_state(prefix_sum), affine=affine if vectorize else None,
+            dedupe=dedupe)
+        ProblemModel._limit(opt, timeout)
+        now = time.time()
+        deadline = None if timeout == None else now + timeout
+        with _memory_limit(max_memory):
+            if config in ('binary', 'tactic'):
+                result, model = self._bisect(opt, y, specs, timeout)
+            else:
+                result, model = self._optimize(opt, y, specs=specs, deadline=deadline)
+        specs['time_solve'] = time.time() - now
+        return result, ProblemModel._assignment(model, x, y), specs
+
+    def _portfolio(self, value_dict, configs, **kwargs):
+        # race the configurations in separate processes; the first proven answer
+        # wins and the others are killed. Without one, the best incumbent is kept
+        if self.objective.type != 'int':
+            configs = [c for c in configs if c not in ('binary', 'tactic')]
+        results = multiprocessing.Queue()
+        procs = {c: multiprocessing.Process(target=_portfolio_worker,
+            args=(self, value_dict, c, kwargs, results), daemon=True) for c in configs}
+        now = time.time()
+        for p in procs.values():
+            p.start()
+
+        best, errors = None, []
+        pending = set(procs)
+        try:
+            while pending:
+                try:
+                    config, result, assignment, specs = results.get(timeout=_portfolio_poll)
+                except queue.Empty:
+                    # a worker that exits posts its result first, so one that
+                    # died with an error code (killed for memory, crashed) never will
+                    for c in [c for c in pending if procs[c].exitcode not in (None, 0)]:
+                        errors.append('{}: exited with code {}'.format(c, procs[c].exitcode))
+                        pending.discard(c)
+                    continue
+                pending.discard(config)
+                specs['portfolio'] = config
+                if specs['status'] in ('optimal', 'unsat'):
+                    best = (result, assignment, specs)
+                    break
+                if specs['status'] == 'error':
+                    errors.append('{}: {}'.format(config, specs['reason']))
+                    continue
+                better = best == None or best[0] == None or (result != None and
+                    (result > best[0] if self.objective.goal == 'max' else result < best[0]))
+                if better:
+                    best = (result, assignment, specs)
+        finally:
+            for p in procs.values():
+                if p.is_alive():
+                    p.terminate()
+                p.join()
+
+        if best == None:
+            raise Exception('Every portfolio configuration failed: {}'.format('; '.join(errors)))
+        best[2]['time_portfolio'] = time.time() - now
+        return best
+
+    @staticmethod
+    def _unknown(opt, specs, deadline=None):
+        # Optimize often gives a plain 'unknown' when its timeout hits, so a
+        # check that ran up to the deadline is a timeout whatever the reason
+        reason = opt.reason_unknown()
+        timed_out = deadline != None and time.time() + _deadline_slack >= deadline
+        specs['status'] = 'timeout' if reason in ('timeout', 'canceled') or timed_out else 'unknown'
+        specs['reason'] = reason
+
+    def _solver(self, value_dict, specs, prefix_sum='shared', presolve=False, vectorize=True,
+            dedupe=True):
+        # a plain incremental solver with every constraint asserted, and its x
+        value_dict = dict(value_dict)
+        _, x, y = self._declare(value_dict)
+        s = z3.Solver()
+        specs.update({'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0,
+            'n_duplicate': 0})
+        constraints, affine = self.constraint, {}
+        if presolve:
+            x, assertions, constraints, affine = self._presolve(value_dict, x, specs)
+            s.add(assertions)
+        ProblemModel._build(constraints, value_dict, x, y, s, specs,
+            prefix=ProblemModel._prefix_state(prefix_sum), affine=affine if vectorize else None,
+            dedupe=dedupe)
+        return s, x
+
+    @staticmethod
+    def _enumerate(s, x, limit=None, deadline=None, specs=None):
+        # the models of s projected on x. Every model found is blocked by a
+        # clause on the x[i] that are not constants, so s keeps what it learned
+        # between checks. specs['status'] ends as complete, limit, timeout or
+        # unknown
+        free = [i for i, e in enumerate(x) if not (z3.is_int_value(e) or z3.is_rational_value(e))]
+        count = 0
+        while True:
+            if limit != None and count >= limit:
+                specs['status'] = 'limit'
+                return
+            if deadline != None:
+                left = deadline - time.time()
+                if left <= 0:
+                    specs['status'] = 'timeout'
+                    return
+                s.set('timeout', max(1, int(left * 1000)))
+            r = s.check()
+            if r == z3.unsat:
+                specs['status'] = 'complete'
+                return
+            if r != z3.sat:
+                ProblemModel._unknown(s, specs, deadline)
+                return
+            model = s.model()
+            values = [model.eval(e, model_completion=True) for e in x]
+            yield values
+            count += 1
+            s.add(z3.Or([x[i] != values[i] for i in free]))
+
+    def _cubes(self, value_dict, target):
+        # assignments [(i, value), ...] to the x[i] with the fewest possible
+        # values, enough of them to give about target cubes that cover every
+        # solution; [[]] when no x[i] has a small finite domain
+        n = ProblemModel._get_number(self.variable.count, value_dict)
+        lo, hi, sets, _ = self._domains(value_dict, n)
+        domains = []
+        for i in range(n):
+            values = sets[i]
+            if values == None and lo[i] != None and hi[i] != None:
+                values = range(lo[i], hi[i] + 1)
+            if values == None:
+                continue
+            values = sorted(v for v in values if (lo[i] == None or v >= lo[i])
+                and (hi[i] == None or v <= hi[i]))
+            if 1 < len(values) <= target:
+                domains.append((len(values), i, values))
+        domains.sort()
+
+        cubes = [[]]
+        for _, i, values in domains:
+            if len(cubes) >= target:
+                break
+            cubes = [c + [(i, v)] for c in cubes for v in values]
+        return cubes
+
+    def _key(self, value_dict):
+        # content hash of everything the answer depends on: the problem without
+        # its text, the (possibly mutated) goal, the inputs and the parameters
+        problem = {k: v for k, v in self.json.items() if k != 'text'}
+        values = {k: v if isinstance(v, (int, float, str)) else list(v)
+            for k, v in value_dict.items()}
+        key = json.dumps({'problem': problem, 'goal': self.objective.goal,
+            'values': values}, sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _assignment(model, x, y):
+        # plain python values of a z3 model, for results that outlive the solver
+        if model == None or isinstance(model, dict):
+            return model
+        return {
+            'x': [_to_python(model.eval(v, model_completion=True)) for v in x],
+            'y': _to_python(model.eval(y, model_completion=True)),
+        }
+
+    @staticmethod
+    def _load_smt(path, opt, specs):
+        # the first line of a cached file is a comment holding the counts of
+        # the build that produced it
+        now = time.time()
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        header = text.split('\n', 1)[0]
+        if header.startswith('; specs '):
+            specs.update(json.loads(header[len('; specs '):]))
+        opt.from_string(text)
+        specs['time_constraint'] = time.time() - now
+
+    @staticmethod
+    def _save_smt(path, opt, specs):
+        counts = {k: specs[k] for k in ('n_constraint', 'n_unit', 'n_prefix')}
+        directory = os.path.dirname(path) or '.'
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('; specs {}\n'.format(json.dumps(counts)))
+                _write_smt(f, list(opt.assertions()))
+            os.replace(tmp, path)
+        except BaseException:
+            # an interrupted or failed write leaves no partial file behind
+            os.remove(tmp)
+            raise
+
+    def solve(self, verbose = False, nosolve=False, input_=None, prefix_sum='shared', params=None,
+            cache=None, smt_cache=None, timeout=None, max_memory=None, portfolio=None,
+            presolve=False, vectorize=True, profile=False, hint=None, dedupe=True, shards=None,
+            relax=False, hint_baseline=False):
+        # input_ is an input file, a dict of input values, or None to ask for them.
+        # cache is a ResultCache or a directory for one; a hit returns the stored
+        # result and the assignment {'x': [...], 'y': ...} in place of the z3 model.
+        # smt_cache is a directory of SMT-LIB2 files with the built assertions:
+        # an existing file is loaded instead of expanding the constraints, a
+        # missing one is written after the expansion (also with nosolve).
+        # portfolio=True (or a list of configuration names) races several
+        # solver configurations for max/min goals; the model is then returned
+        # as an assignment and specs['portfolio'] names the winner.
+        # presolve=True re-encodes x[i] from the domains its loop constraints
+        # give it and drops the constraints the encoding already implies.
+        # vectorize=False expands affine sums and constant bounds element by
+        # element instead of from their coefficient vectors.
+        # dedupe=False asserts an atom as often as it is built, see _Intern;
+        # specs['n_duplicate'] counts the ones that were dropped.
+        # shards=N (True for one per core) expands the constraints in N
+        # processes, see _build_shards; specs['n_shard'] is the number of
+        # pieces merged. A profile is always built serially.
+        # profile=True times every constraint of the build into specs['profile']
+        # (see _Profile) and adds the z3 statistics of the check as
+        # specs['statistics']; write_profile saves them. The portfolio and a
+        # hit of either cache build nothing, so there is no profile then.
+        # hint is a known or heuristic answer, see _hint: a right one is
+        # proven optimal without optimizing, a wrong one only costs its checks
+        # (specs['hint'] and specs['time_hint_check']). The portfolio ignores it.
+        # hint_baseline=True solves again without the hint afterwards, see
+        # _baseline, and reports specs['time_saved'].
+        # relax=True first bounds y by the LP relaxation of the assertions, see
+        # _relax; an integral LP optimum that checks out is returned with an
+        # assignment in place of the z3 model
+        value_dict = self._values(input_=input_, params=params)
+
+        key = None
+        if cache != None and not nosolve:
+            if isinstance(cache, str):
+                cache = ResultCache(cache)
+            key = self._key(value_dict)
+            entry = cache.get(key)
+            if entry != None:
+                specs = entry['specs']
+                specs['cache'] = 'hit'
+                specs['cache_hits'], specs['cache_misses'] = cache.hits, cache.misses
+                return entry['result'], entry['model'], specs
+
+        if portfolio and not nosolve and self.objective.goal != 'exist':
+            configs = _portfolio_configs if portfolio == True else portfolio
+            result, model, specs = self._portfolio(value_dict, configs,
+                prefix_sum=prefix_sum, timeout=timeout, max_memory=max_memory, presolve=presolve,
+                vectorize=vectorize, dedupe=dedupe)
+            if key != None and specs['status'] in ('optimal', 'unsat'):
+                specs['cache'] = 'miss'
+                cache.put(key, {'result': result, 'model': model, 'specs': specs})
+                specs['cache_hits'], specs['cache_misses'] = cache.hits, cache.misses
+            return result, model, specs
+
+        opt, x, y = self._declare(value_dict)
+
+        specs = {'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0,
+            'n_duplicate': 0}
+        prefix = ProblemModel._prefix_state(prefix_sum)
+        constraints, assertions, affine = self.constraint, [], {}
+        if presolve:
+            x, assertions, constraints, affine = self._presolve(value_dict, x, specs)
+        smt_path = None
+        if smt_cache != None:
+            os.makedirs(smt_cache, exist_ok=True)
+            smt_path = os.path.join(smt_cache, '{}-{}{}.smt2'.format(
+                key or self._key(value_dict), prefix_sum, '-presolve' if presolve else ''))
+        if smt_path != None and os.path.exists(smt_path):
+            ProblemModel._load_smt(smt_path, opt, specs)
+            specs['smt_cache'] = 'hit'
+        else:
+            opt.add(assertions)
+            profiler = _Profile() if profile else None
+            if shards is True:
+                shards = os.cpu_count()
+            sharded = bool(shards) and shards > 1 and profiler == None and \
+                self._build_shards(constraints, value_dict, x, y, opt, specs, shards, affine,
+                    prefix_sum=prefix_sum, vectorize=vectorize, dedupe=dedupe, verbose=verbose)
+            if not sharded:
+                ProblemModel._build(constraints, value_dict, x, y, opt, specs,
+                    verbose=verbose, prefix=prefix, affine=affine if vectorize else None,
+                    profile=profiler, dedupe=dedupe)
+            if profiler != None:
+                specs['profile'] = profiler.records()
+            if smt_path != None:
+                ProblemModel._save_smt(smt_path, opt, specs)
+                specs['smt_cache'] = 'miss'
+
+        if nosolve:
+            specs['time_solve'] = None
+            return None, None, specs
+
+        ProblemModel._limit(opt, timeout)
+        now = time.time()
+        deadline = None if timeout == None else now + timeout
+        hinted, cold = None, None
+        with _memory_limit(max_memory):
+            if relax and self.objective.goal != 'exist' and np != None:
+                hinted = self._relax(opt, x, y, value_dict, specs)
+            if hint != None and hinted == None:
+                if hint_baseline:
+                    cold = list(opt.assertions())
+                hinted = self._hint(opt, x, y, hint, value_dict, specs, affine, timeout)
+            if hinted != None:
+                result, model = hinted
+            else:
+                result, model = self._optimize(opt, y, specs=specs, deadline=deadline)
         specs['time_solve'] = time.time() - now
+        if cold != None:
+            self._baseline(cold, y, specs, timeout, max_memory)
+        if profile:
+            specs['statistics'] = _statistics(opt)
+
+        # results cut short by a limit are not final, so they are not cached
+        if key != None and specs['status'] in ('optimal', 'sat', 'unsat'):
+            specs['cache'] = 'miss'
+            cache.put(key, {'result': _to_python(result),
+                'model': ProblemModel._assignment(model, x, y), 'specs': specs})
+            specs['cache_hits'], specs['cache_misses'] = cache.hits, cache.misses
         return result, model, specs
+
+    @staticmethod
+    def write_profile(specs, path):
+        # the profile of a solve as JSON, with the z3 statistics, or as folded
+        # stacks for a flame graph when path does not end in .json
+        records = specs.get('profile')
+        if records == None:
+            raise Exception('No profile in specs, solve with profile=True')
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump({'profile': records, 'statistics': specs.get('statistics'),
+                    'time_constraint': specs.get('time_constraint'),
+                    'time_solve': specs.get('time_solve')}, f, indent=2)
+            else:
+                f.write(_folded(records, specs.get('time_solve')))
+
+    def session(self, input_=None, verbose=False, prefix_sum='shared', timeout=None, max_memory=None,
+            vectorize=True, dedupe=True):
+        return _Session(self, input_=input_, verbose=verbose, prefix_sum=prefix_sum,
+            timeout=timeout, max_memory=max_memory, vectorize=vectorize, dedupe=dedupe)
+
+    def solve_many(self, inputs, workers=None, **kwargs):
+        # yields (input, result, specs) in completion order; the keyword
+        # arguments are passed on to solve for every input. An input that
+        # fails, or whose worker dies, yields a None result with
+        # specs {'status': 'error', 'reason': ...}, the others go on
+        if workers == 1:
+            _init_worker(self)
+            for input_ in inputs:
+                yield _solve_worker(input_, kwargs)
+            return
+
+        pool = _futures.ProcessPoolExecutor(max_workers=workers,
+            initializer=_init_worker, initargs=(self,))
+        try:
+            futures = {pool.submit(_solve_worker, input_, kwargs): input_ for input_ in inputs}
+            for f in _futures.as_completed(futures):
+                try:
+                    out = f.result()
+                except Exception as e:
+                    out = futures[f], None, {'status': 'error', 'reason': str(e) or type(e).__name__}
+                yield out
+        finally:
+            pool.shutdown(cancel_futures=True)
     
         
+    def solutions(self, input_=None, params=None, limit=None, timeout=None, specs=None,
+            **kwargs):
+        # yields every feasible assignment of x as a list, one check at a time;
+        # the objective is ignored. limit caps the number of assignments and
+        # timeout the seconds spent after the constraints are built. specs, if
+        # given, is filled in as the generator runs: n_solution and status,
+        # which is complete once every assignment was found. The keyword
+        # arguments are prefix_sum, presolve, vectorize and dedupe as for solve
+        if specs == None:
+            specs = {}
+        value_dict = self._values(input_=input_, params=params)
+        s, x = self._solver(value_dict, specs, **kwargs)
+        deadline = None if timeout == None else time.time() + timeout
+        specs['n_solution'] = 0
+        for values in ProblemModel._enumerate(s, x, limit, deadline, specs):
+            specs['n_solution'] += 1
+            yield [_to_python(v) for v in values]
+
+    def count(self, input_=None, params=None, workers=None, limit=None, timeout=None, **kwargs):
+        # the number of feasible assignments of x, and specs. The space is cut
+        # into cubes that fix the x[i] with the smallest domains; every worker
+        # process builds the solver once and enumerates its share of the cubes
+        # inside push/pop. limit and timeout apply to every worker, the count is
+        # clamped to limit; specs['status'] is complete when nothing cut it short
+        now = time.time()
+        value_dict = self._values(input_=input_, params=params)
+        workers = workers or os.cpu_count()
+        cubes = self._cubes(value_dict, 4 * workers) if workers > 1 else [[]]
+        chunks = [cubes[k::workers] for k in range(min(workers, len(cubes)))]
+
+        if len(chunks) == 1:
+            _init_worker(self)
+            results = [_count_worker(value_dict, chunks[0], limit, timeout, kwargs)]
+        else:
+            pool = _futures.ProcessPoolExecutor(max_workers=len(chunks),
+                initializer=_init_worker, initargs=(self,))
+            try:
+                futures = [pool.submit(_count_worker, value_dict, c, limit, timeout, kwargs)
+                    for c in chunks]
+                results = [f.result() for f in futures]
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+        total = sum(c for c, _ in results)
+        statuses = set(status for _, status in results)
+        specs = {'n_cube': len(cubes), 'workers': len(chunks)}
+        if limit != None and (total >= limit or 'limit' in statuses):
+            total, specs['status'] = min(total, limit), 'limit'
+        else:
+            for status in ('unknown', 'timeout', 'complete'):
+                if status in statuses:
+                    specs['status'] = status
+                    break
+        specs['time_count'] = time.time() - now
+        return total, specs
+
     def mutate(self, mode=None):
         modes = ('objective', 'constraint', 'parameter')
         if mode==None:
@@ -543,43 +3235,146 @@ class ProblemModel:
         elif mode not in modes:
             raise Exception('Illegal mode: {}'.format(mode))
         
-        lang = _words[self.lang]
-        res = copy.deepcopy(self)
-        
         if mode=='objective':
-            obj = self.objective
-            before, after = self.problem_text[:obj.index[0]-1], self.problem_text[obj.index[1]:]
-            target = 'min' if obj.goal == 'max' else 'max'
-            
-            res.problem_text = before + lang[target] + after
-            res.objective.goal = target
-            res.objective.index = [len(before)+1, len(before)+len(lang[target])]
+            target = 'min' if self.objective.goal == 'max' else 'max'
+            return self._variant(goal=target)
 
         elif mode=='constraint':
             cons = list(filter(lambda x: x.index!=None, self.constraint))
             if len(cons) == 0:
                 raise Exception('No constraints to mutate')
-            con = random.choice(cons)
+            # a constraint only marks where its rval is in the text, there
+            # is no range to draw a new value from
+            raise Exception('Constraint mutation is not supported')
         
-        elif mode == 'parameter':
+        else:
             if len(self.param) == 0:
                 raise Exception('No parameters to mutate')
-            pIndex = random.randint(0, len(self.param)-1)
-            param = self.param[pIndex]
+            param = random.choice(self.param)
+            lo, hi = param.range
 
-            if param.range[1]-param.range[0] <= 0:
+            if hi-lo <= 0:
                 raise Exception('Range too narrow: {}'.format(param.range))
             
-            newval = random.randint(param.range[0], param.range[1])
-            while newval==param.value:
-                newval = random.randint(param.range[0], param.range[1])
-            
-            before, after = self.problem_text[:param.index[0]-1], self.problem_text[param.index[1]:]
-            res.problem_text = before + str(newval) + after
-            res.param[pIndex].value = newval
-            res.param[pIndex].index[1] = param.index[0]+len(str(newval))-1
+            # draw from the range without the current value, no retries needed
+            if lo <= param.value <= hi:
+                newval = random.randint(lo, hi-1)
+                if newval >= param.value:
+                    newval += 1
+            else:
+                newval = random.randint(lo, hi)
+            return self._variant(values={param.name: newval})
 
-        else:
-            pass
+    def _variant(self, goal=None, values=None):
+        # a mutated copy that shares the parsed constraints, inputs and variable
+        # with self, nothing changes them after parsing; only the text, the
+        # objective and the parameters are new. The goal and the parameter
+        # values (name -> value) are written into the text, and the indices
+        # of the spans after an edit move with it
+        res = copy.copy(self)
+        res.objective = copy.copy(self.objective)
+        res.param = [copy.copy(p) for p in self.param]
+
+        edits = []
+        if goal != None and goal != self.objective.goal:
+            res.objective.goal = goal
+            edits.append((res.objective, _words[self.lang][goal]))
+        for p in res.param:
+            if values and p.name in values and values[p.name] != p.value:
+                p.value = values[p.name]
+                edits.append((p, str(p.value)))
+        edits.sort(key=lambda e: e[0].index[0])
+
+        text, pieces, last, shifts = self.problem_text, [], 0, []
+        for item, word in edits:
+            start, end = item.index
+            pieces += [text[last:start-1], word]
+            last = end
+            shifts.append((item, end, len(word) - (end - start + 1)))
+        pieces.append(text[last:])
+        res.problem_text = ''.join(pieces)
+
+        for item in [res.objective] + res.param:
+            start, end = item.index
+            before = sum(d for _, e, d in shifts if e < start)
+            own = sum(d for it, _, d in shifts if it is item)
+            item.index = [start + before, end + before + own]
+
+        res.json = dict(self.json, text=res.problem_text)
+        res.json['objective'] = dict(self.json['objective'], goal=res.objective.goal,
+            index=res.objective.index)
+        if isinstance(self.json.get('parameter'), list):
+            res.json['parameter'] = [dict(obj, value=p.value, index=p.index)
+                for obj, p in zip(self.json['parameter'], res.param)]
+        elif isinstance(self.json.get('parameter'), dict):
+            p = res.param[0]
+            res.json['parameter'] = dict(self.json['parameter'], value=p.value, index=p.index)
+        return res
+
+    def _digest(self):
+        # canonical hash of the problem as written, text included
+        return hashlib.sha256(json.dumps(self.json, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def mutate_many(self, n, modes=('objective', 'parameter'), seed=None, input_=None,
+            workers=None, **kwargs):
+        # up to n distinct variants, drawn without repetition from every goal
+        # and every parameter value in its range; variants that hash the same
+        # as the problem or an earlier variant are skipped. Without input_ the
+        # variants are yielded; with it they are solved on workers processes
+        # and (problem_text, parameters, result) is yielded in completion
+        # order, the keyword arguments are passed on to solve
+        for mode in modes:
+            if mode == 'constraint':
+                raise Exception('Constraint mutation is not supported')
+            if mode not in ('objective', 'parameter'):
+                raise Exception('Illegal mode: {}'.format(mode))
+        variants = self._variants(n, modes, random.Random(seed))
+        if input_ == None:
+            yield from variants
+            return
+
+        tasks = ((v.objective.goal, {p.name: p.value for p in v.param}) for v in variants)
+        if workers == 1:
+            _init_worker(self)
+            for goal, values in tasks:
+                yield _variant_worker(goal, values, input_, kwargs)
+            return
+
+        pool = _futures.ProcessPoolExecutor(max_workers=workers,
+            initializer=_init_worker, initargs=(self,))
+        try:
+            futures = [pool.submit(_variant_worker, goal, values, input_, kwargs)
+                for goal, values in tasks]
+            for f in _futures.as_completed(futures):
+                yield f.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _variants(self, n, modes, rng):
+        goals = [self.objective.goal]
+        if 'objective' in modes and self.objective.goal in ('max', 'min'):
+            goals.append('min' if self.objective.goal == 'max' else 'max')
+        dims = [goals] + [range(p.range[0], p.range[1]+1) if 'parameter' in modes
+            else [p.value] for p in self.param]
+        total = 1
+        for d in dims:
+            total *= len(d)
 
-        return res
\ No newline at end of file
+        seen = {self._digest()}
+        count = 0
+        # one more than n, since one of them may be the problem itself
+        for k in _sample(rng, total, min(n+1, total)):
+            choice = []
+            for d in reversed(dims):
+                k, r = divmod(k, len(d))
+                choice.append(d[r])
+            goal, *values = reversed(choice)
+            variant = self._variant(goal, {p.name: v for p, v in zip(self.param, values)})
+            digest = variant._digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            yield variant
+            count += 1
+            if count == n:
+                return
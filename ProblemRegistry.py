@@ -0,0 +1,163 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import ProblemModel as _module
+from ProblemModel import ProblemModel
+
+_default_path = os.path.join(os.path.expanduser('~'), '.cache', 'ProblemModel', 'registry')
+
+
+@functools.lru_cache(maxsize=None)
+def _version():
+    # parsed models only load into the interpreter and the ProblemModel.py
+    # that made them: pickles name its classes, the constraints carry
+    # marshalled code objects
+    with open(_module.__file__, 'rb') as f:
+        source = hashlib.sha256(f.read()).hexdigest()
+    return '{}-{}'.format(sys.implementation.cache_tag, source)
+
+
+class ProblemRegistry:
+    # the problems of a directory by name (the file name without .json),
+    # each parsed once. The parsed models are pickled into one cache file per
+    # directory; on the next start a problem whose mtime and size are
+    # unchanged is not read at all, one whose content hash is unchanged is
+    # not parsed again. Models are unpickled on their first lookup. A problem
+    # that does not parse is in errors instead, and raises on lookup
+    def __init__(self, path='problem', cache=None):
+        self.path = path
+        self.cache = cache or _default_path
+        self.errors = {}
+        self.specs = {}
+        self._entries = {}
+        self._models = {}
+        self._dirty = False
+        self.scan()
+
+    def _file(self):
+        key = hashlib.sha256(os.path.abspath(self.path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache, '{}.pickle'.format(key))
+
+    def _load(self):
+        try:
+            with open(self._file(), 'rb') as f:
+                version, entries = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return {}
+        return entries if version == _version() else {}
+
+    def save(self):
+        # write to a temporary file first, so parallel readers never see half a cache
+        os.makedirs(self.cache, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.cache, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((_version(), self._entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._file())
+        self._dirty = False
+
+    def _compile(self, name, path, st, cached=None):
+        # the entry (mtime_ns, size, sha256, pickled model, error) of a file
+        # whose stat changed; the model is reused when the content is not
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._dirty = True
+        if cached != None and cached[2] == digest:
+            self.specs['n_hashed'] += 1
+            return (st.st_mtime_ns, st.st_size, digest) + cached[3:]
+        self.specs['n_parsed'] += 1
+        self._models.pop(name, None)
+        try:
+            model = ProblemModel(path)
+        except Exception as e:
+            return (st.st_mtime_ns, st.st_size, digest, None, str(e))
+        self._models[name] = model
+        return (st.st_mtime_ns, st.st_size, digest,
+            pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL), None)
+
+    def scan(self):
+        # brings the registry up to date with the directory and saves the
+        # cache if anything changed. specs counts the problems by what they
+        # needed: n_cached only a stat, n_hashed a read, n_parsed a parse
+        now = time.time()
+        self.specs = {'n_problem': 0, 'n_cached': 0, 'n_hashed': 0, 'n_parsed': 0}
+        cached = self._entries or self._load()
+        entries = {}
+        files = os.scandir(self.path) if os.path.isdir(self.path) else ()
+        for e in files:
+            if not e.name.endswith('.json') or not e.is_file():
+                continue
+            name = e.name[:-len('.json')]
+            st = e.stat()
+            old = cached.get(name)
+            if old != None and old[:2] == (st.st_mtime_ns, st.st_size):
+                self.specs['n_cached'] += 1
+                entries[name] = old
+            else:
+                entries[name] = self._compile(name, e.path, st, old)
+        self._dirty |= entries.keys() != cached.keys()
+        for name in set(self._models) - set(entries):
+            del self._models[name]
+        self._entries = entries
+        self.errors = {name: entry[4] for name, entry in entries.items() if entry[4] != None}
+        self.specs['n_problem'] = len(entries)
+        if self._dirty:
+            self.save()
+        self.specs['time_scan'] = time.time() - now
+        return self.specs
+
+    def names(self):
+        return sorted(self._entries)
+
+    def file(self, name):
+        return os.path.join(self.path, '{}.json'.format(name))
+
+    def name(self, path):
+        # the name of a problem file of this directory, None for any other file
+        directory, base = os.path.split(os.path.abspath(path))
+        if directory != os.path.abspath(self.path) or not base.endswith('.json'):
+            return None
+        name = base[:-len('.json')]
+        return name if name in self._entries else None
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __getitem__(self, name):
+        # the parsed model of a problem; a file changed since the scan is
+        # parsed again, so long-running users see edits
+        entry = self._entries.get(name)
+        if entry == None:
+            raise Exception('Cannot find problem {}'.format(name))
+        try:
+            st = os.stat(self.file(name))
+        except OSError:
+            raise Exception('Cannot find problem {}'.format(name))
+        if entry[:2] != (st.st_mtime_ns, st.st_size):
+            entry = self._entries[name] = self._compile(name, self.file(name), st, entry)
+            if entry[4] != None:
+                self.errors[name] = entry[4]
+            else:
+                self.errors.pop(name, None)
+        if entry[4] != None:
+            raise Exception(entry[4])
+        model = self._models.get(name)
+        if model == None:
+            model = self._models[name] = pickle.loads(entry[3])
+        return model
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except Exception:
+            return default
@@ -0,0 +1,69 @@
+import os
+import tempfile
+try:
+    import ujson as json
+except:
+    import json
+
+_default_path = os.path.join(os.path.expanduser('~'), '.cache', 'ProblemModel', 'results')
+
+
+class ResultCache:
+    # one json file per key; the file mtime is bumped on every hit, so the
+    # oldest mtime is the least recently used entry
+    def __init__(self, path=None, max_entries=4096, max_bytes=None):
+        self.path = path or _default_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, '{}.json'.format(key))
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        # write to a temporary file first, so parallel solvers never read half an entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._file(key))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for e in os.scandir(self.path):
+            if e.name.endswith('.json'):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or
+                (self.max_bytes != None and total > self.max_bytes)):
+            _, size, path = entries.pop(0)
+            total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for e in os.scandir(self.path):
+            if e.name.endswith('.json'):
+                os.remove(e.path)
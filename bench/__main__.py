@@ -0,0 +1,4 @@
+import sys
+from bench.runner import main
+
+sys.exit(main())
@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+try:
+    import ujson as json
+except:
+    import json
+
+import numpy as np
+
+from ProblemModel import ProblemModel
+from bench.runner import manifest_path
+
+# inputs of any size from the input spec of a problem and its generator
+# manifest bench/generators/<name>.json (stock_price_2 uses that of stock_price):
+#   {"inputs": {"n": "size", "p": [1, 100], "k": "n // 2"},
+#    "sets": {"large": {"size": 20000, "seed": 1, "format": "npy"}}}
+# A scalar input is an expression of size and the earlier inputs, or [lo, hi]
+# for a uniform draw; an array input is [lo, hi] and takes the length its
+# problem gives it. Ints are drawn from lo..hi, reals from [lo, hi). The same
+# (size, seed) gives the same input on every run. "sets" registers inputs for
+# python -m bench --generated; bench.scaling uses the manifest when there is one
+# usage: python -m bench.generate stock_price --size 1000000 --output big.txt
+#        python -m bench.generate stock_price --sets
+
+_default_path = os.path.join(os.path.expanduser('~'), '.cache', 'ProblemModel', 'data')
+
+# elements formatted per write of a text array
+_chunk = 1 << 20
+
+parser = argparse.ArgumentParser()
+parser.add_argument('problem', help='problem name')
+parser.add_argument('--root', default='.', help='repository root', dest='root')
+parser.add_argument('--size', type=int, default=None, help='value of size', dest='size')
+parser.add_argument('--seed', type=int, default=0, help='random seed', dest='seed')
+parser.add_argument('--output', default=None,
+    help='input file: .npz for every input in one archive, else text', dest='output')
+parser.add_argument('--npy', action='store_true',
+    help='write the arrays of a text input as @file.npy next to it', dest='npy')
+parser.add_argument('--sets', action='store_true',
+    help='write the sets the manifest registers to --cache-dir', dest='sets')
+parser.add_argument('--cache-dir', default=None,
+    help='directory of the generated sets', dest='cache_dir')
+
+
+def manifest(root, name):
+    # the generator manifest of a problem, None when it has none
+    path = manifest_path(root, name)
+    if path == None:
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def values(model, spec, size, seed):
+    # the inputs of model as name -> number or numpy array
+    rng = np.random.default_rng(seed)
+    out = {'size': size}
+    for i in model.input:
+        if i.name not in spec:
+            raise Exception('Cannot find input {} in generator manifest'.format(i.name))
+        rule = spec[i.name]
+        real = i.type in ('real', 'realarray')
+        if i.type in ('int', 'real'):
+            if isinstance(rule, list):
+                value = rng.uniform(*rule) if real else rng.integers(rule[0], rule[1] + 1)
+            else:
+                value = ProblemModel._get_number(rule, out)
+            out[i.name] = float(value) if real else int(value)
+        else:
+            if not isinstance(rule, list) or len(rule) != 2:
+                raise Exception('Illegal generator range for {}: need [lo, hi]'.format(i.name))
+            length = ProblemModel._get_number(i.length, out)
+            lo, hi = rule
+            out[i.name] = rng.uniform(lo, hi, length) if real else \
+                rng.integers(lo, hi + 1, length, dtype=np.int64)
+    out.pop('size')
+    out.pop('__builtins__', None)
+    return out
+
+
+def write(model, vals, path, npy=False):
+    # an .npz archive, or the text format: one line per input, arrays space
+    # separated, or as @file.npy references with npy. The file is written
+    # under a temporary name first, so an interrupted run leaves no input
+    tmp = path + '.tmp'
+    if path.endswith('.npz'):
+        with open(tmp, 'wb') as f:
+            np.savez(f, **{k: np.asarray(v) for k, v in vals.items()})
+        os.replace(tmp, path)
+        return
+    stem = os.path.splitext(path)[0]
+    with open(tmp, 'w') as f:
+        for i in model.input:
+            v = vals[i.name]
+            if i.type in ('int', 'real'):
+                f.write('{}\n'.format(v))
+            elif npy:
+                target = '{}.{}.npy'.format(stem, i.name)
+                np.save(target, v)
+                f.write('@{}\n'.format(os.path.basename(target)))
+            else:
+                for k in range(0, len(v), _chunk):
+                    f.write(' ' if k else '')
+                    f.write(' '.join(map(str, v[k:k + _chunk].tolist())))
+                f.write('\n')
+    os.replace(tmp, path)
+
+
+def generate(root, name, size, seed, path, npy=False):
+    # writes the input of the given size; False when the problem has no manifest
+    spec = manifest(root, name)
+    if spec == None:
+        return False
+    model = ProblemModel(os.path.join(root, 'problem', '{}.json'.format(name)))
+    write(model, values(model, spec['inputs'], size, seed), path, npy=npy)
+    return True
+
+
+def generated_sets(root, name, cache=None):
+    # the paths of the sets the manifest registers, each written once to
+    # cache: the file name holds a hash of the manifest and the set
+    spec = manifest(root, name)
+    if spec == None:
+        return []
+    cache = cache or _default_path
+    os.makedirs(cache, exist_ok=True)
+    paths = []
+    for label, s in sorted(spec.get('sets', {}).items()):
+        key = hashlib.sha256(json.dumps([spec['inputs'], s], sort_keys=True).encode(
+            'utf-8')).hexdigest()[:12]
+        ext = '.npz' if s.get('format') == 'npz' else '.txt'
+        path = os.path.join(cache, '{}-{}-{}{}'.format(name, label, key, ext))
+        if not os.path.exists(path):
+            generate(root, name, s['size'], s.get('seed', 0), path, npy=s.get('format') == 'npy')
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    if manifest(root, args.problem) == None:
+        parser.error('{} has no generator manifest'.format(args.problem))
+    if args.sets:
+        for path in generated_sets(root, args.problem, args.cache_dir):
+            print(path)
+        parser.exit()
+    if args.size == None or args.output == None:
+        parser.error('need --size and --output, or --sets')
+    now = time.time()
+    generate(root, args.problem, args.size, args.seed, args.output, npy=args.npy)
+    print('{} written in {:.3f}s'.format(args.output, time.time() - now), file=sys.stderr)
@@ -0,0 +1,82 @@
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# load every problem of a directory three ways, each in a fresh interpreter:
+# ProblemModel(path) per file, a ProblemRegistry with an empty cache (cold,
+# which also fills the cache) and one with that cache (warm), imports not
+# counted. Scan is the time until every name is known, load until every
+# model is parsed.
+# --copies multiplies the corpus, to measure a directory of hundreds
+# usage: python -m bench.registry [--root .] [--copies 50] [--repeat 5]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--root', default='.', help='repository root', dest='root')
+parser.add_argument('--problem-dir', default=None,
+    help='directory of problems (default: problem/ of the root)', dest='problem_dir')
+parser.add_argument('--copies', type=int, default=1,
+    help='copies of every problem in the measured directory', dest='copies')
+parser.add_argument('--repeat', type=int, default=5,
+    help='runs per measurement, the median is reported', dest='repeat')
+
+# prints the scan and the load time of one way to load the directory argv[1]
+_code = '''
+import glob, os, sys, time
+from ProblemModel import ProblemModel
+from ProblemRegistry import ProblemRegistry
+t = time.perf_counter()
+if sys.argv[2] == 'parse':
+    paths = sorted(glob.glob(os.path.join(sys.argv[1], '*.json')))
+    scanned = time.perf_counter()
+    models = [ProblemModel(p) for p in paths]
+else:
+    registry = ProblemRegistry(sys.argv[1], sys.argv[3])
+    scanned = time.perf_counter()
+    models = [registry.get(n) for n in registry]
+print(scanned - t, time.perf_counter() - t, len(models))
+'''
+
+
+def measure(root, path, mode, cache):
+    out = subprocess.run([sys.executable, '-c', _code, path, mode, cache], cwd=root,
+        check=True, capture_output=True, text=True).stdout
+    scan, load, n = out.split()[-3:]
+    return float(scan), float(load), int(n)
+
+
+def corpus(source, target, copies):
+    for path in sorted(glob.glob(os.path.join(source, '*.json'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        for k in range(copies):
+            shutil.copy(path, os.path.join(target, '{}_{}.json'.format(name, k)))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    source = os.path.abspath(args.problem_dir or os.path.join(root, 'problem'))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = source
+        if args.copies > 1:
+            path = os.path.join(tmp, 'problem')
+            os.makedirs(path)
+            corpus(source, path, args.copies)
+        cache = os.path.join(tmp, 'cache')
+
+        runs = {'parse': [], 'cold': [], 'warm': []}
+        for _ in range(args.repeat):
+            runs['parse'].append(measure(root, path, 'parse', cache))
+            shutil.rmtree(cache, ignore_errors=True)
+            runs['cold'].append(measure(root, path, 'registry', cache))
+            runs['warm'].append(measure(root, path, 'registry', cache))
+
+    print('{:<10}{:>10}{:>12}{:>12}'.format('', 'problems', 'scan', 'load'))
+    for mode, times in runs.items():
+        print('{:<10}{:>10}{:>10.1f}ms{:>10.1f}ms'.format(mode, times[0][2],
+            statistics.median(t[0] for t in times) * 1000,
+            statistics.median(t[1] for t in times) * 1000))
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import glob
+import importlib
+import multiprocessing
+import os
+import re
+import sys
+import time
+try:
+    import ujson as json
+except:
+    import json
+
+from ProblemModel import ProblemModel, _to_python
+
+FIELDS = ('problem', 'input', 'size', 'status', 'result', 'expected', 'correct',
+    'time_constraint', 'time_solve', 'hint', 'n_unit', 'n_constraint', 'peak_rss_kb')
+
+# a regression is a slowdown by more than this ratio and at least this many seconds
+TIME_RATIO = 1.5
+TIME_FLOOR = 0.05
+
+
+def data_dir(root, name):
+    # stock_price_2 shares the inputs of stock_price
+    for n in (name, re.sub(r'_\d+$', '', name)):
+        path = os.path.join(root, 'data', n)
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def manifest_path(root, name):
+    # the generator manifest of a problem in bench/generators (see
+    # bench.generate), shared like its data; None when it has none
+    for n in (name, re.sub(r'_\d+$', '', name)):
+        path = os.path.join(root, 'bench', 'generators', '{}.json'.format(n))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def data_files(path):
+    def key(f):
+        digits = re.findall(r'\d+', os.path.basename(f))
+        return (int(digits[-1]) if digits else 0, f)
+    return sorted(glob.glob(os.path.join(path, '*.txt')), key=key)
+
+
+def input_size(model, input_):
+    # the length of the longest array input, or the largest scalar otherwise
+    values = model._input(input_=input_)
+    sizes = [len(v) for v in values.values() if hasattr(v, '__len__')]
+    if not sizes:
+        sizes = [v for v in values.values() if isinstance(v, int)]
+    return max(sizes or [0])
+
+
+def reference_solver(name):
+    try:
+        module = importlib.import_module('standard.{}'.format(name))
+    except ImportError:
+        return None
+    return module.solve
+
+
+def reference(name, values):
+    solver = reference_solver(name)
+    return None if solver == None else solver(**values)
+
+
+def _child(conn, problem, input_, kwargs):
+    # runs in a fresh process, so ru_maxrss is the peak of this solve alone
+    import resource
+    try:
+        model = ProblemModel(problem)
+        name = os.path.splitext(os.path.basename(problem))[0]
+        if kwargs.get('hint') == 'standard':
+            kwargs['hint'] = reference_solver(name)
+        result, _, specs = model.solve(input_=input_, **kwargs)
+        expected = reference(name, model._input(input_=input_))
+        conn.send({
+            'status': 'ok',
+            'result': _to_python(result),
+            'expected': expected,
+            'specs': specs,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+    except Exception as e:
+        conn.send({'status': 'error', 'error': str(e)})
+    conn.close()
+
+
+def run_one(problem, input_, timeout=None, **kwargs):
+    # solve one (problem, input) pair in a child process and return a report record
+    ctx = multiprocessing.get_context('spawn')
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(child, problem, input_, kwargs))
+    now = time.time()
+    proc.start()
+    child.close()
+    out = None
+    if parent.poll(timeout):
+        try:
+            out = parent.recv()
+        except EOFError:
+            pass
+    if proc.is_alive():
+        proc.terminate()
+    proc.join()
+
+    record = dict.fromkeys(FIELDS)
+    record['problem'] = os.path.splitext(os.path.basename(problem))[0]
+    record['input'] = input_
+    if out == None:
+        record['status'] = 'timeout' if time.time() - now >= (timeout or 0) else 'error'
+        return record
+
+    record['status'] = out['status']
+    if out['status'] != 'ok':
+        record['error'] = out['error']
+        return record
+    specs = out['specs']
+    for k in ('time_constraint', 'time_solve', 'hint', 'n_unit', 'n_constraint'):
+        record[k] = specs.get(k)
+    record['result'] = out['result']
+    record['expected'] = out['expected']
+    if out['expected'] != None:
+        record['correct'] = out['result'] == out['expected']
+    record['peak_rss_kb'] = out['peak_rss_kb']
+    return record
+
+
+def write_report(records, path):
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, 'w') as f:
+            json.dump(records, f, indent=2)
+
+
+def read_report(path):
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            records = list(csv.DictReader(f))
+        for r in records:
+            for k in ('time_constraint', 'time_solve'):
+                r[k] = float(r[k]) if r[k] else None
+        return records
+    with open(path) as f:
+        return json.load(f)
+
+
+def diff(records, baseline):
+    # list of human readable regressions against a saved report
+    old = {(r['problem'], os.path.basename(r['input'])): r for r in baseline}
+    regressions = []
+    for r in records:
+        key = (r['problem'], os.path.basename(r['input']))
+        if key not in old:
+            continue
+        b = old[key]
+        if b['status'] == 'ok' and r['status'] != 'ok':
+            regressions.append('{} {}: status {} -> {}'.format(*key, b['status'], r['status']))
+            continue
+        if r['status'] != 'ok':
+            continue
+        if str(r['result']) != str(b['result']):
+            regressions.append('{} {}: result {} -> {}'.format(*key, b['result'], r['result']))
+        for k in ('time_constraint', 'time_solve'):
+            if r[k] == None or b[k] == None:
+                continue
+            if r[k] > b[k] * TIME_RATIO and r[k] - b[k] > TIME_FLOOR:
+                regressions.append('{} {}: {} {:.3f}s -> {:.3f}s'.format(*key, k, b[k], r[k]))
+    return regressions
+
+
+def speedups(records, baseline):
+    # baseline time_solve / new time_solve, and the seconds saved, for every
+    # input solved in both
+    old = {(r['problem'], os.path.basename(r['input'])): r for r in baseline}
+    out = []
+    for r in records:
+        b = old.get((r['problem'], os.path.basename(r['input'])))
+        if b and r['time_solve'] and b['time_solve']:
+            out.append((r['problem'], os.path.basename(r['input']), b['time_solve'] / r['time_solve'],
+                b['time_solve'] - r['time_solve']))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    parser.add_argument('--root', default='.', help='repository root', dest='root')
+    parser.add_argument('--problems', nargs='*', default=None,
+        help='problem names to run (default: all in problem/)', dest='problems')
+    parser.add_argument('--max-size', type=int, default=None,
+        help='skip inputs larger than this', dest='max_size')
+    parser.add_argument('--timeout', type=float, default=60,
+        help='seconds per solve', dest='timeout')
+    parser.add_argument('--prefix-sum', default='shared', choices=('shared', 'aux', 'naive'),
+        help='encoding of sums over moving windows', dest='prefix_sum')
+    parser.add_argument('--presolve', action='store_true',
+        help='solve with the domain presolve', dest='presolve')
+    parser.add_argument('--hint', action='store_true',
+        help='hint every solve with the answer of its standard/ solver', dest='hint')
+    parser.add_argument('--generated', action='store_true',
+        help='also run the input sets the generator manifests register, see bench.generate',
+        dest='generated')
+    parser.add_argument('--output', default='bench_report.json',
+        help='report file, .json or .csv', dest='output')
+    parser.add_argument('--baseline', default=None,
+        help='report to compare against', dest='baseline')
+    args = parser.parse_args(argv)
+
+    records = []
+    for problem in sorted(glob.glob(os.path.join(args.root, 'problem', '*.json'))):
+        name = os.path.splitext(os.path.basename(problem))[0]
+        if args.problems and name not in args.problems:
+            continue
+        path = data_dir(args.root, name)
+        if path == None:
+            print('{}: no data directory, skipped'.format(name))
+            continue
+        model = ProblemModel(problem)
+        inputs = data_files(path)
+        if args.generated:
+            # the generator needs numpy and imports this module
+            from bench.generate import generated_sets
+            inputs += generated_sets(args.root, name)
+        for input_ in inputs:
+            size = input_size(model, input_)
+            if args.max_size != None and size > args.max_size:
+                continue
+            record = run_one(problem, input_, timeout=args.timeout, prefix_sum=args.prefix_sum,
+                presolve=args.presolve, hint='standard' if args.hint else None)
+            record['size'] = size
+            records.append(record)
+            print('{} {} n={}: {} result={} expected={} constraint={} solve={} rss={}KB'.format(
+                name, os.path.basename(input_), size, record['status'], record['result'],
+                record['expected'], record['time_constraint'], record['time_solve'],
+                record['peak_rss_kb']))
+
+    write_report(records, args.output)
+    print('Report written to {}'.format(args.output))
+
+    wrong = [r for r in records if r['correct'] == False]
+    for r in wrong:
+        print('WRONG: {} {}: {} != {}'.format(r['problem'], r['input'], r['result'], r['expected']))
+
+    regressions = []
+    if args.baseline:
+        baseline = read_report(args.baseline)
+        for problem, input_, ratio, saved in speedups(records, baseline):
+            print('{} {}: solve {:.2f}x the speed of the baseline, {:.3f}s saved'.format(
+                problem, input_, ratio, saved))
+        regressions = diff(records, baseline)
+        for r in regressions:
+            print('REGRESSION: {}'.format(r))
+        if not regressions:
+            print('No regressions against {}'.format(args.baseline))
+    return 1 if wrong or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import argparse
+import glob
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+try:
+    import ujson as json
+except:
+    import json
+
+from bench.runner import data_dir, manifest_path, run_one
+
+# solve inputs of geometric sizes made by the data generators and fit how
+# construction and solve time, atoms and memory grow with n: the exponent b
+# of c*n^b by least squares on log-log. A size that times out ends the run of
+# its problem, and 'limit' extrapolates the size whose solve takes --timeout
+# usage: python -m bench.scaling --problems stock_price --max-size 2000
+
+METRICS = ('time_constraint', 'time_solve', 'n_unit', 'n_constraint', 'memory_kb')
+
+# metrics fitted as their growth over the smallest size: the peak RSS holds the
+# interpreter and z3, and the build the first use of the lazily imported modules
+OFFSET = {'time_constraint': 'time_constraint', 'memory_kb': 'peak_rss_kb'}
+
+# times below this many seconds are mostly noise and are not fitted
+TIME_FLOOR = 0.005
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--root', default='.', help='repository root', dest='root')
+parser.add_argument('--problems', nargs='*', default=None,
+    help='problem names to run (default: all with a generator)', dest='problems')
+parser.add_argument('--min-size', type=int, default=10, help='smallest n', dest='min_size')
+parser.add_argument('--max-size', type=int, default=5000, help='largest n', dest='max_size')
+parser.add_argument('--factor', type=float, default=2, help='ratio of successive sizes',
+    dest='factor')
+parser.add_argument('--timeout', type=float, default=60, help='seconds per solve', dest='timeout')
+parser.add_argument('--seed', type=int, default=0, help='seed of the generators', dest='seed')
+parser.add_argument('--prefix-sum', default='shared', choices=('shared', 'aux', 'naive'),
+    help='encoding of sums over moving windows', dest='prefix_sum')
+parser.add_argument('--presolve', action='store_true',
+    help='solve with the domain presolve', dest='presolve')
+parser.add_argument('--output', default=None, help='JSON report of every run and fit',
+    dest='output')
+
+
+def sizes(lo, hi, factor):
+    out, n = [], float(lo)
+    while round(n) <= hi:
+        if not out or round(n) > out[-1]:
+            out.append(int(round(n)))
+        n *= factor
+    return out
+
+
+def generate(root, name, n, seed, path):
+    # the input of size n from the generator manifest of the problem (see
+    # bench.generate), else from data/<name>/gen.py with n on stdin and random
+    # seeded with seed; either way the same sizes give the same inputs on every run
+    if manifest_path(root, name) != None:
+        from bench.generate import generate as from_manifest
+        from_manifest(root, name, n, seed, path)
+        return
+    gen = os.path.join(data_dir(root, name), 'gen.py')
+    code = 'import random, runpy, sys; random.seed(int(sys.argv[1])); ' \
+        'runpy.run_path(sys.argv[2], run_name="__main__")'
+    with open(path, 'w') as f:
+        subprocess.run([sys.executable, '-c', code, str(seed), gen], input='{}\n'.format(n),
+            stdout=f, check=True, text=True)
+
+
+def fit(points):
+    # (exponent, coefficient) of c*n^b over [(n, value)], None with fewer
+    # than three usable points
+    points = [(n, v) for n, v in points if v != None and v > 0]
+    if len(points) < 3 or len(set(n for n, _ in points)) < 2:
+        return None
+    slope, intercept = statistics.linear_regression(
+        [math.log(n) for n, _ in points], [math.log(v) for _, v in points])
+    return slope, math.exp(intercept)
+
+
+def fits(records):
+    ok = [r for r in records if r['status'] == 'ok']
+    out = {}
+    for k in METRICS:
+        if k in OFFSET:
+            if len(ok) < 2:
+                continue
+            base = ok[0][OFFSET[k]]
+            points = [(r['size'], r[OFFSET[k]] - base) for r in ok[1:]]
+        else:
+            points = [(r['size'], r[k]) for r in ok]
+        if k.startswith('time'):
+            points = [(n, v) for n, v in points if v >= TIME_FLOOR]
+        f = fit(points)
+        if f != None:
+            out[k] = f
+    return out
+
+
+def row(record):
+    cells = []
+    for k, unit in (('time_constraint', 's'), ('time_solve', 's'), ('n_unit', ''),
+            ('n_constraint', ''), ('peak_rss_kb', 'KB')):
+        v = record[k]
+        cells.append('-' if v == None else '{:.3f}s'.format(v) if unit == 's' else
+            '{}{}'.format(v, unit))
+    return cells
+
+
+def limit(fitted, timeout):
+    # the n whose solve is expected to take timeout seconds
+    if 'time_solve' not in fitted or fitted['time_solve'][0] <= 0:
+        return None
+    b, c = fitted['time_solve']
+    return int((timeout / c) ** (1 / b))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for problem in sorted(glob.glob(os.path.join(root, 'problem', '*.json'))):
+            name = os.path.splitext(os.path.basename(problem))[0]
+            if args.problems and name not in args.problems:
+                continue
+            path = data_dir(root, name)
+            if manifest_path(root, name) == None and (path == None or
+                    not os.path.exists(os.path.join(path, 'gen.py'))):
+                if args.problems:
+                    print('{}: no generator, skipped'.format(name))
+                continue
+
+            print('{:<14}{:>8}{:>9}{:>12}{:>12}{:>10}{:>10}{:>12}'.format(name, 'n', 'status',
+                'constraint', 'solve', 'units', 'atoms', 'rss'))
+            records = []
+            for n in sizes(args.min_size, args.max_size, args.factor):
+                input_ = os.path.join(tmp, '{}-{}.txt'.format(name, n))
+                generate(root, name, n, args.seed + n, input_)
+                record = run_one(problem, input_, timeout=args.timeout,
+                    prefix_sum=args.prefix_sum, presolve=args.presolve)
+                record['size'] = n
+                record['input'] = None
+                records.append(record)
+                print('{:<14}{:>8}{:>9}{:>12}{:>12}{:>10}{:>10}{:>12}'.format('', n,
+                    record['status'], *row(record)))
+                if record['status'] != 'ok':
+                    break
+
+            fitted = fits(records)
+            for k in METRICS:
+                if k in fitted:
+                    print('{:<14}{:<16} ~ n^{:.2f}'.format('', k, fitted[k][0]))
+                else:
+                    print('{:<14}{:<16} too few points to fit'.format('', k))
+            n_limit = limit(fitted, args.timeout)
+            if n_limit != None:
+                print('{:<14}solve reaches {:g}s near n = {}'.format('', args.timeout, n_limit))
+            print()
+            report[name] = {'runs': records, 'limit': n_limit,
+                'fit': {k: {'exponent': b, 'coefficient': c} for k, (b, c) in fitted.items()}}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Report written to {}'.format(args.output))
@@ -0,0 +1,56 @@
+import argparse
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# measure what a short-lived process pays before it can do any work: the
+# import of ProblemModel (z3 and numpy are only loaded on first use) against
+# an eager import of z3, and the time to parse and validate each problem
+# usage: python -m bench.startup [--root .] [--repeat 10]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--root', default='.', help='repository root', dest='root')
+parser.add_argument('--repeat', type=int, default=10,
+    help='runs per measurement, the median is reported', dest='repeat')
+
+
+def import_time(statement, root, repeat):
+    # wall time of the statement in a fresh interpreter, without its startup
+    code = 'import time; t = time.perf_counter(); {}; print(time.perf_counter() - t)'.format(
+        statement)
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=root, check=True,
+            capture_output=True, text=True).stdout
+        times.append(float(out.split()[-1]))
+    return statistics.median(times)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    for name, statement in (('import ProblemModel', 'import ProblemModel'),
+            ('import z3', 'import z3'),
+            ('import ProblemModel, first z3 use', 'import ProblemModel; ProblemModel.z3.Int')):
+        print('{:<36}{:>9.1f}ms'.format(name, import_time(statement, root, args.repeat) * 1000))
+
+    sys.path.insert(0, root)
+    from ProblemModel import ProblemModel
+    print()
+    print('{:<28}{:>12}{:>12}{:>8}'.format('problem', 'parse', 'validate', 'errors'))
+    for path in sorted(glob.glob(os.path.join(root, 'problem', '*.json'))):
+        parse, check = [], []
+        for _ in range(args.repeat):
+            now = time.perf_counter()
+            model = ProblemModel(path)
+            parse.append(time.perf_counter() - now)
+            now = time.perf_counter()
+            errors = model.validate()
+            check.append(time.perf_counter() - now)
+        print('{:<28}{:>10.3f}ms{:>10.3f}ms{:>8}'.format(os.path.basename(path),
+            statistics.median(parse) * 1000, statistics.median(check) * 1000, len(errors)))
+    print()
+    print('z3 loaded by validation: {}'.format('z3.z3' in sys.modules))
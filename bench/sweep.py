@@ -0,0 +1,45 @@
+import argparse
+import time
+from ProblemModel import ProblemModel
+
+# compare a parameter sweep through one incremental session against
+# calling solve() again for every value
+# usage: python -m bench.sweep problem/stock_price.json --input data/stock_price/data1.txt
+
+parser = argparse.ArgumentParser()
+parser.add_argument('filepath', help='path for the problem json file')
+parser.add_argument('--input', required=True, help='input file', dest='input')
+parser.add_argument('--param', default=None,
+    help='parameter to sweep (default: the first one)', dest='param')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    model = ProblemModel(args.filepath)
+    if len(model.param) == 0:
+        raise Exception('No parameters to sweep')
+    name = args.param or model.param[0].name
+    lo, hi = [p for p in model.param if p.name == name][0].range
+
+    now = time.time()
+    repeated = []
+    for value in range(lo, hi+1):
+        result, _, specs = model.solve(input_=args.input, params={name: value})
+        repeated.append(result)
+        print('solve    {}={}: {} ({:.3f}s)'.format(name, value, result,
+            specs['time_constraint'] + specs['time_solve']))
+    time_repeated = time.time() - now
+
+    now = time.time()
+    session = model.session(input_=args.input)
+    incremental = []
+    for value, result, _, specs in session.sweep(name):
+        incremental.append(result)
+        print('session  {}={}: {} ({:.3f}s)'.format(name, value, result,
+            specs['time_constraint'] + specs['time_solve']))
+    time_incremental = time.time() - now
+
+    if [str(r) for r in repeated] != [str(r) for r in incremental]:
+        raise Exception('Sweep results differ: {} != {}'.format(repeated, incremental))
+    print('repeated solve(): {:.3f}s'.format(time_repeated))
+    print('session sweep:    {:.3f}s (base constraints {:.3f}s)'.format(
+        time_incremental, session.specs['time_constraint']))
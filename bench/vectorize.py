@@ -0,0 +1,51 @@
+import argparse
+import os
+import time
+from ProblemModel import ProblemModel
+from bench.runner import data_dir, data_files, input_size
+
+# compare building the constraints of every input with the affine sums
+# expanded from their coefficient vectors against one eval per element;
+# only the construction is timed, nothing is solved
+# usage: python -m bench.vectorize --problems stock_price sequence
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--root', default='.', help='repository root', dest='root')
+parser.add_argument('--problems', nargs='*', default=['stock_price', 'sequence'],
+    help='problem names to run', dest='problems')
+parser.add_argument('--prefix-sum', default='shared', choices=('shared', 'aux', 'naive'),
+    help='encoding of sums over moving windows', dest='prefix_sum')
+parser.add_argument('--presolve', action='store_true',
+    help='build with the domain presolve, so two-valued x[i] give PB constraints',
+    dest='presolve')
+parser.add_argument('--repeat', type=int, default=3,
+    help='builds per input, the fastest one is reported', dest='repeat')
+
+
+def build_time(model, input_, repeat, **kwargs):
+    best, specs = None, None
+    for _ in range(repeat):
+        now = time.time()
+        _, _, specs = model.solve(input_=input_, nosolve=True, **kwargs)
+        spent = time.time() - now
+        best = spent if best == None else min(best, spent)
+    return best, specs
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    print('{:<14}{:<12}{:>8}{:>12}{:>12}{:>9}{:>9}'.format(
+        'problem', 'input', 'size', 'naive', 'vectorized', 'speedup', 'affine'))
+    for name in args.problems:
+        model = ProblemModel(os.path.join(args.root, 'problem', '{}.json'.format(name)))
+        path = data_dir(args.root, name)
+        if path == None:
+            print('{}: no data directory, skipped'.format(name))
+            continue
+        for input_ in data_files(path):
+            kwargs = dict(prefix_sum=args.prefix_sum, presolve=args.presolve)
+            naive, _ = build_time(model, input_, args.repeat, vectorize=False, **kwargs)
+            fast, specs = build_time(model, input_, args.repeat, vectorize=True, **kwargs)
+            print('{:<14}{:<12}{:>8}{:>11.3f}s{:>11.3f}s{:>8.2f}x{:>9}'.format(
+                name, os.path.basename(input_), input_size(model, input_), naive, fast,
+                naive / fast if fast else float('inf'), specs['n_affine']))
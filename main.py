@@ -1,30 +1,191 @@
 import argparse
+import importlib
+import json
+import os
 from ProblemModel import ProblemModel
+from ResultCache import ResultCache
 
 parser = argparse.ArgumentParser()
-parser.add_argument('filepath', help='path for the problem json file')
-parser.add_argument('-v', '--verbose', action='store_true', 
+parser.add_argument('filepath', nargs='?', default=None,
+    help='path for the problem json file (optional with --serve)')
+parser.add_argument('-v', '--verbose', action='store_true',
     help='verbose mode', dest='verbose')
-parser.add_argument('--parse-only', action='store_true', 
+parser.add_argument('--parse-only', action='store_true',
     help='only parse, do not solve', dest='nosolve')
 parser.add_argument('--input', default=None, help='input file', dest='input')
-args = parser.parse_args()
+parser.add_argument('--inputs', default=None,
+    help='directory of input files, solved in parallel', dest='inputs')
+parser.add_argument('--jobs', type=int, default=None,
+    help='number of worker processes for --inputs (default: all cores)', dest='jobs')
+parser.add_argument('--prefix-sum', default='shared', choices=('shared', 'aux', 'naive'),
+    help='encoding of sums over moving windows', dest='prefix_sum')
+parser.add_argument('--timeout', type=float, default=None,
+    help='seconds per solve; max/min goals return the best value found so far', dest='timeout')
+parser.add_argument('--max-memory', type=int, default=None,
+    help='memory limit of z3 in megabytes', dest='max_memory')
+parser.add_argument('--portfolio', nargs='*', default=None,
+    choices=('optimize', 'binary', 'seed', 'tactic'),
+    help='race solver configurations in parallel (default: all of them)', dest='portfolio')
+parser.add_argument('--presolve', action='store_true',
+    help='re-encode x from the domains of its loop constraints', dest='presolve')
+parser.add_argument('--no-vectorize', action='store_true',
+    help='expand affine sums element by element', dest='novectorize')
+parser.add_argument('--no-dedupe', action='store_true',
+    help='assert an atom again every time it is built', dest='nodedupe')
+parser.add_argument('--shards', type=int, default=None,
+    help='expand the constraints in this many processes (0: one per core)', dest='shards')
+parser.add_argument('--relax', action='store_true',
+    help='bound the goal by the LP relaxation before optimizing', dest='relax')
+parser.add_argument('--profile', default=None,
+    help='write a per-constraint profile of the build: .json, or folded stacks for a flame graph',
+    dest='profile')
+parser.add_argument('--hint', default=None,
+    help='a known value of the goal to prove optimal, or "standard" for the answer of '
+        'the standard/ solver of the problem', dest='hint')
+parser.add_argument('--hint-baseline', action='store_true',
+    help='also solve without the hint and report the time it saved', dest='hint_baseline')
+parser.add_argument('--no-cache', action='store_true',
+    help='do not read or write the result cache', dest='nocache')
+parser.add_argument('--cache-dir', default=None,
+    help='directory of the result cache', dest='cache_dir')
+parser.add_argument('--smt-cache', default=None,
+    help='directory of prebuilt SMT-LIB2 assertions', dest='smt_cache')
+parser.add_argument('--prebuild', action='store_true',
+    help='only fill --smt-cache for the input(s), do not solve', dest='prebuild')
+parser.add_argument('--mutate', type=int, default=None,
+    help='write this many distinct variants as JSON lines, solved when --input is given',
+    dest='mutate')
+parser.add_argument('--seed', type=int, default=None,
+    help='random seed for --mutate', dest='seed')
+parser.add_argument('--check', action='store_true',
+    help='only validate the problem, or every problem in a directory, without z3',
+    dest='check')
+parser.add_argument('--check-assignment', default=None,
+    help='only check a JSON file {"x": [...], "y": ...} against --input, without z3',
+    dest='assignment')
+parser.add_argument('--serve', action='store_true',
+    help='answer JSON-lines solve requests on stdin, or on --socket', dest='serve')
+parser.add_argument('--socket', default=None,
+    help='Unix socket path for --serve', dest='socket')
+parser.add_argument('--problem-dir', default='problem',
+    help='directory of the problems --serve knows by name', dest='problem_dir')
+parser.add_argument('--registry-cache', default=None,
+    help='directory of the cache of parsed problems for --serve', dest='registry_cache')
 
-filepath = args.filepath
-verbose = args.verbose
-nosolve = args.nosolve
-input_ = args.input
+if __name__ == '__main__':
+    args = parser.parse_args()
 
-model = ProblemModel(filepath, verbose=verbose)
-#model.print()
-a,b,c = model.solve(verbose=verbose, nosolve=nosolve, input_=input_)
-# print(a)
-# print(b)
-print(c)
+    filepath = args.filepath
+    verbose = args.verbose
+    nosolve = args.nosolve
+    input_ = args.input
+    prefix_sum = args.prefix_sum
+    cache = None if args.nocache else ResultCache(args.cache_dir)
+    smt_cache = args.smt_cache
+    portfolio = args.portfolio
+    shards = True if args.shards == 0 else args.shards
+    if portfolio == []:
+        portfolio = True
+    if args.prebuild:
+        if smt_cache == None:
+            parser.error('--prebuild needs --smt-cache')
+        nosolve = True
+
+    if args.serve:
+        # asyncio is only imported for the server
+        from server import Server
+        server = Server(problem_dir=args.problem_dir, workers=args.jobs,
+            registry_cache=args.registry_cache, preload=[filepath] if filepath else (), prefix_sum=prefix_sum, cache=cache,
+            smt_cache=smt_cache, timeout=args.timeout, max_memory=args.max_memory,
+            presolve=args.presolve, vectorize=not args.novectorize,
+            dedupe=not args.nodedupe, relax=args.relax)
+        server.run(args.socket)
+        parser.exit()
+    if filepath == None:
+        parser.error('the following arguments are required: filepath')
+
+    if args.check:
+        if os.path.isdir(filepath):
+            paths = sorted(os.path.join(filepath, f) for f in os.listdir(filepath)
+                if f.endswith('.json'))
+        else:
+            paths = [filepath]
+        failed = 0
+        for path in paths:
+            try:
+                errors = ProblemModel(path).validate()
+            except Exception as e:
+                errors = [str(e)]
+            failed += len(errors) > 0
+            for e in errors:
+                print('{}: {}'.format(path, e))
+            if not errors and verbose:
+                print('{}: ok'.format(path))
+        parser.exit(1 if failed else 0)
+
+    model = ProblemModel(filepath, verbose=verbose)
+    #model.print()
+    hint = args.hint
+    if hint == 'standard':
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        try:
+            hint = importlib.import_module('standard.{}'.format(name)).solve
+        except (ImportError, AttributeError) as e:
+            parser.error('--hint standard: cannot load solve of standard/{}.py: {}'.format(name, e))
+    elif hint != None:
+        hint = float(hint) if model.objective.type == 'real' else int(hint)
+    if args.assignment != None:
+        with open(args.assignment) as f:
+            assignment = json.load(f)
+        errors = model.check_assignment(input_, assignment['x'], assignment.get('y'))
+        for e in errors:
+            print(e)
+        if not errors and verbose:
+            print('{}: ok'.format(args.assignment))
+        parser.exit(1 if errors else 0)
+    if args.mutate != None:
+        modes = [m for m in ('objective', 'parameter')
+            if m == 'objective' or len(model.param) > 0]
+        if input_ == None:
+            for v in model.mutate_many(args.mutate, modes=modes, seed=args.seed):
+                print(json.dumps({'text': v.problem_text, 'goal': v.objective.goal,
+                    'params': {p.name: p.value for p in v.param}}, ensure_ascii=False))
+        else:
+            for text, params, result in model.mutate_many(args.mutate, modes=modes,
+                    seed=args.seed, input_=input_, workers=args.jobs, prefix_sum=prefix_sum,
+                    cache=cache, timeout=args.timeout, max_memory=args.max_memory,
+                    presolve=args.presolve, vectorize=not args.novectorize,
+                    dedupe=not args.nodedupe):
+                print(json.dumps({'text': text, 'params': params, 'result': result},
+                    ensure_ascii=False))
+    elif args.inputs != None:
+        inputs = sorted(os.path.join(args.inputs, f) for f in os.listdir(args.inputs)
+            if os.path.isfile(os.path.join(args.inputs, f)) and not f.endswith('.py'))
+        for input_, a, c in model.solve_many(inputs, workers=args.jobs,
+                verbose=verbose, nosolve=nosolve, prefix_sum=prefix_sum, cache=cache,
+                smt_cache=smt_cache, timeout=args.timeout, max_memory=args.max_memory,
+                portfolio=portfolio, presolve=args.presolve, vectorize=not args.novectorize,
+                dedupe=not args.nodedupe, relax=args.relax):
+            print(input_, a, c)
+    else:
+        a,b,c = model.solve(verbose=verbose, nosolve=nosolve, input_=input_,
+            prefix_sum=prefix_sum, cache=cache, smt_cache=smt_cache,
+            timeout=args.timeout, max_memory=args.max_memory, portfolio=portfolio,
+            presolve=args.presolve, vectorize=not args.novectorize, dedupe=not args.nodedupe,
+            profile=args.profile != None, hint=hint, shards=shards, relax=args.relax,
+            hint_baseline=args.hint_baseline)
+        if args.profile != None:
+            if 'profile' in c:
+                ProblemModel.write_profile(c, args.profile)
+            else:
+                print('Nothing was built, no profile written')
+        # print(a)
+        # print(b)
+        print(c)
 
 # newmodel = model.mutate('parameter')
 # print(newmodel.problem_text)
 # newmodel = newmodel.mutate('parameter')
 # print(newmodel.problem_text)
 # a,b = newmodel.solve(verbose=verbose)
-# print(a,b)
\ No newline at end of file
+# print(a,b)
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+try:
+    import ujson as json
+except:
+    import json
+
+from ProblemModel import ProblemModel, _to_python
+from ProblemRegistry import ProblemRegistry
+
+# request fields passed on to ProblemModel.solve
+_options = ('params', 'timeout', 'max_memory', 'prefix_sum', 'presolve', 'vectorize',
+    'profile', 'dedupe', 'shards', 'relax')
+_fields = ('id', 'problem', 'input', 'inputs') + _options
+
+# longest request line; inputs may be sent inline
+_line_limit = 1 << 26
+
+# models parsed by this process, by path; a file that changed is parsed again.
+# The problems of the problem directory come from its registry instead, whose
+# cache the server filled before the workers started
+_models = {}
+_registry = None
+
+def _model(path):
+    name = _registry.name(path) if _registry != None else None
+    if name != None:
+        return _registry[name]
+    mtime = os.stat(path).st_mtime
+    entry = _models.get(path)
+    if entry == None or entry[0] != mtime:
+        entry = _models[path] = (mtime, ProblemModel(path))
+    return entry[1]
+
+def _preload(problem_dir, cache, paths):
+    global _registry
+    _registry = ProblemRegistry(problem_dir, cache)
+    for path in paths:
+        _model(path)
+
+def _solve(path, kwargs):
+    # runs in a worker; returns the start time so the server can tell the queueing time
+    start = time.time()
+    model = _model(path)
+    parsed = time.time()
+    result, _, specs = model.solve(**kwargs)
+    specs['time_parse'] = parsed - start
+    return start, _to_python(result), specs
+
+
+class Server:
+    # answers JSON-lines requests like
+    #   {"id": 1, "problem": "stock_price", "input": "data/stock_price/data1.txt",
+    #    "params": {"k": 3}, "timeout": 10}
+    # with {"id": 1, "status": "ok", "result": ..., "specs": {...}} or
+    # {"id": 1, "status": "error", "error": "..."}, in completion order.
+    # "inputs" gives the input values as a dict instead of a file; "max_memory"
+    # limits only the request it is given with. A problem is
+    # a file or the name of a file in problem_dir. The problems of problem_dir
+    # are parsed once into a ProblemRegistry (registry_cache is its cache
+    # directory) that the workers load; they keep every other model they
+    # parsed, so only the first request on such a problem pays for parsing.
+    # At most max_pending requests are in flight, further ones are not read
+    def __init__(self, problem_dir='problem', workers=None, max_pending=None, preload=(),
+            registry_cache=None, **defaults):
+        self.problem_dir = problem_dir
+        self.workers = workers or os.cpu_count()
+        self.defaults = defaults
+        self.pending = asyncio.Semaphore(max_pending or 4 * self.workers)
+        self.registry = ProblemRegistry(problem_dir, registry_cache)
+        preload = [self._path(p) for p in preload]
+        if self.workers == 1:
+            # z3 is not thread safe, so a single worker thread solves in this process
+            global _registry
+            _registry = self.registry
+            for path in preload:
+                _model(path)
+            self.pool = ThreadPoolExecutor(1)
+        else:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_preload,
+                initargs=(problem_dir, registry_cache, preload))
+
+    def _path(self, problem):
+        if problem in self.registry:
+            return self.registry.file(problem)
+        if os.path.isfile(problem):
+            return problem
+        path = os.path.join(self.problem_dir, '{}.json'.format(problem))
+        if os.path.isfile(path):
+            return path
+        raise Exception('Cannot find problem {}'.format(problem))
+
+    async def handle(self, line):
+        received = time.time()
+        rid = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise Exception('Illegal request: need a JSON object')
+            rid = request.get('id')
+            unknown = [k for k in request if k not in _fields]
+            if unknown:
+                raise Exception('Unknown request fields: {}'.format(', '.join(unknown)))
+            if 'problem' not in request:
+                raise Exception('Need problem in request as \'problem\'')
+            path = self._path(request['problem'])
+
+            kwargs = dict(self.defaults)
+            kwargs['input_'] = request.get('inputs', request.get('input'))
+            if kwargs['input_'] == None:
+                raise Exception('Need input or inputs in request')
+            for k in _options:
+                if k in request:
+                    kwargs[k] = request[k]
+
+            loop = asyncio.get_running_loop()
+            start, result, specs = await loop.run_in_executor(self.pool, _solve, path, kwargs)
+            specs['time_queue'] = max(0, start - received)
+            specs['time_total'] = time.time() - received
+            return {'id': rid, 'status': 'ok', 'result': result, 'specs': specs}
+        except Exception as e:
+            return {'id': rid, 'status': 'error', 'error': str(e)}
+
+    async def _respond(self, line, write):
+        try:
+            write(json.dumps(await self.handle(line)) + '\n')
+        finally:
+            self.pending.release()
+
+    async def _serve(self, readline, write):
+        tasks = set()
+        while True:
+            await self.pending.acquire()
+            line = await readline()
+            if not line:
+                self.pending.release()
+                break
+            if not line.strip():
+                self.pending.release()
+                continue
+            task = asyncio.ensure_future(self._respond(line, write))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def serve_stdio(self):
+        # stdin may be a file as well as a pipe, so it is read by a thread
+        loop = asyncio.get_running_loop()
+
+        def readline():
+            return loop.run_in_executor(None, sys.stdin.buffer.readline)
+
+        def write(s):
+            sys.stdout.write(s)
+            sys.stdout.flush()
+
+        await self._serve(readline, write)
+
+    async def serve_unix(self, path):
+        async def client(reader, writer):
+            try:
+                await self._serve(reader.readline, lambda s: writer.write(s.encode()))
+                await writer.drain()
+            finally:
+                writer.close()
+
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(client, path=path, limit=_line_limit)
+        # stop on SIGTERM as on Ctrl-C, so the socket file is removed
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            os.remove(path)
+
+    def run(self, socket=None):
+        # serve a Unix socket, or stdin until it is closed
+        try:
+            asyncio.run(self.serve_unix(socket) if socket else self.serve_stdio())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.pool.shutdown(cancel_futures=True)
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+import z3
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUTS = [
+    ('sequence', os.path.join(ROOT, 'data', 'sequence', 'data1.txt')),
+    ('stock_price', os.path.join(ROOT, 'data', 'stock_price', 'data1.txt')),
+    ('coins', {'n': 3, 'coins': [1, 2, 5], 'amount': 11}),
+    ('thief', {'n': 5, 'c': [2, 7, 9, 3, 1]}),
+]
+
+
+def solution(model, input_):
+    result, m, _ = model.solve(input_=input_)
+    n = ProblemModel._get_number(model.variable.count, model._values(input_=input_))
+    x = [m.eval(v, model_completion=True).as_long() for v in z3.IntVector('x', n)]
+    return x, result.as_long()
+
+
+@pytest.mark.parametrize('name, input_', INPUTS)
+def test_the_solution_of_z3_passes(name, input_):
+    model = ProblemModel(os.path.join(ROOT, 'problem', '{}.json'.format(name)))
+    x, y = solution(model, input_)
+    assert model.check_assignment(input_, x, y) == []
+
+
+@pytest.mark.parametrize('name, input_', INPUTS)
+def test_a_changed_solution_fails(name, input_):
+    model = ProblemModel(os.path.join(ROOT, 'problem', '{}.json'.format(name)))
+    x, y = solution(model, input_)
+    assert model.check_assignment(input_, x, y + 1) != []
+    x[0] = x[0] + 7
+    assert model.check_assignment(input_, x, y) != []
+
+
+def test_length_mismatch_raises():
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    with pytest.raises(Exception, match='length mismatch'):
+        model.check_assignment({'n': 3, 'coins': [1, 2, 5], 'amount': 11}, [1, 0], 1)
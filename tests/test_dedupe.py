@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from ProblemModel import ProblemModel
+
+# atoms repeated by overlapping loops, an or whose operands and whole
+# disjunction repeat, and a single constraint that a loop already asserted
+REPEATS = {
+    'language': 'en',
+    'text': 'repeated atoms',
+    'objective': {'goal': 'max', 'type': 'int', 'index': [0, 1]},
+    'variable': {'type': 'int', 'length': 'n'},
+    'input': [{'name': 'n'}],
+    'constraint': [
+        {'type': 'sum', 'loopvar': 'i', 'term': 'x[i]', 'comp': '=', 'rval': 'y'},
+        {'type': 'loop', 'loopvar': 'i', 'range': [0, 'n-1'], 'term': {
+            'type': 'loop', 'loopvar': 'j', 'range': ['i', 'min(i+2, n-1)'],
+            'term': 'x[j]', 'comp': '>=', 'rval': '0'}},
+        {'type': 'loop', 'loopvar': 'i', 'range': [0, 'n-1'], 'term': {
+            'type': 'or', 'term': [
+                {'term': 'x[0]', 'comp': '<=', 'rval': '5'},
+                {'term': 'x[1]', 'comp': '<=', 'rval': '5'},
+                {'term': 'x[1]', 'comp': '<=', 'rval': '5'}]}},
+        {'type': 'loop', 'loopvar': 'i', 'range': [0, 'n-1'],
+            'term': 'x[0] + x[1]', 'comp': '<=', 'rval': '8'},
+        {'type': 'single', 'term': 'x[0] + x[1]', 'comp': '<=', 'rval': '8'},
+        {'type': 'loop', 'loopvar': 'i', 'term': 'x[i]', 'comp': '<=', 'rval': '3'},
+    ],
+}
+
+
+@pytest.mark.parametrize('presolve', [False, True])
+def test_duplicates_and_constraints_add_up(tmp_path, presolve):
+    path = tmp_path / 'repeats.json'
+    path.write_text(json.dumps(REPEATS))
+    model = ProblemModel(str(path))
+    result, _, specs = model.solve(input_={'n': 6}, presolve=presolve)
+    expected, _, full = model.solve(input_={'n': 6}, presolve=presolve, dedupe=False)
+    assert result.as_long() == expected.as_long() == 18
+    assert specs['n_duplicate'] > 0
+    assert specs['n_constraint'] + specs['n_duplicate'] == full['n_constraint']
@@ -0,0 +1,22 @@
+import os
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COINS = {'n': 3, 'coins': [1, 2, 5], 'amount': 11}
+
+
+def test_baseline_reports_the_time_saved():
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    for hint, label in ((3, 'optimal'), (4, 'high')):
+        result, _, specs = model.solve(input_=COINS, hint=hint, hint_baseline=True)
+        assert result.as_long() == 3
+        assert specs['hint'] == label
+        assert specs['status_baseline'] == 'optimal'
+        assert specs['time_saved'] == specs['time_baseline'] - specs['time_solve']
+
+
+def test_no_baseline_without_asking():
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    _, _, specs = model.solve(input_=COINS, hint=3)
+    assert 'time_saved' not in specs
@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+import pytest
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_float_npy_for_an_intarray_is_rejected(tmp_path):
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    np.save(tmp_path / 'coins.npy', np.array([1.5, 2.0, 5.0]))
+    (tmp_path / 'input.txt').write_text('3\n@coins.npy\n11\n')
+    with pytest.raises(Exception, match='Illegal input'):
+        model._input(str(tmp_path / 'input.txt'))
+
+
+def test_int_npy_for_an_intarray(tmp_path):
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    np.save(tmp_path / 'coins.npy', np.array([1, 2, 5], dtype=np.int32))
+    (tmp_path / 'input.txt').write_text('3\n@coins.npy\n11\n')
+    values = model._input(str(tmp_path / 'input.txt'))
+    assert list(values['coins']) == [1, 2, 5] and values['amount'] == 11
+
+
+def test_empty_array_before_another_input(tmp_path):
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    (tmp_path / 'input.txt').write_text('0\n\n11\n')
+    values = model._input(str(tmp_path / 'input.txt'))
+    assert list(values['coins']) == [] and values['amount'] == 11
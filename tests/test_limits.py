@@ -0,0 +1,30 @@
+import os
+
+import pytest
+import z3
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COINS = {'n': 3, 'coins': [1, 2, 5], 'amount': 11}
+
+
+def test_memory_limit_is_restored():
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    previous = z3.get_param('memory_max_size')
+    with pytest.raises(Exception):
+        model.solve(input_=COINS, max_memory=1)
+    assert z3.get_param('memory_max_size') == previous
+    result, _, specs = model.solve(input_=COINS)
+    assert result.as_long() == 3
+    assert specs['status'] == 'optimal'
+
+
+def test_timeout_reports_no_false_bound():
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'stock_price.json'))
+    result, _, specs = model.solve(input_=os.path.join(ROOT, 'data', 'stock_price', 'data7.txt'),
+        timeout=1)
+    assert specs['status'] == 'timeout'
+    assert not specs['optimal']
+    if result != None and specs['bound'] != None:
+        assert specs['bound'] >= result.as_long()
@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+import pytest
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COINS = {'n': 3, 'coins': [1, 2, 5], 'amount': 11}
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+    reason='the patched configuration has to reach the workers by fork')
+def test_dead_worker_counts_as_failed(monkeypatch):
+    solve_config = ProblemModel._solve_config
+
+    def crash(self, value_dict, config, **kwargs):
+        if config == 'binary':
+            os._exit(137)
+        return solve_config(self, value_dict, config, **kwargs)
+
+    monkeypatch.setattr(ProblemModel, '_solve_config', crash)
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    with pytest.raises(Exception, match='binary: exited with code 137'):
+        model.solve(input_=COINS, portfolio=['binary'])
+    result, _, specs = model.solve(input_=COINS, portfolio=['binary', 'optimize'])
+    assert result == 3
+    assert specs['portfolio'] == 'optimize'
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUTS = [
+    ('sequence', os.path.join(ROOT, 'data', 'sequence', 'data1.txt'), 5680),
+    ('stock_price', os.path.join(ROOT, 'data', 'stock_price', 'data1.txt'), 341),
+    ('stock_price_2', {'n': 5, 'p': [3, 8, 1, 9, 2]}, 13),
+    ('jump', {'n': 5, 'arr': [2, 3, 1, 1, 4]}, 2),
+    ('thief', {'n': 5, 'c': [2, 7, 9, 3, 1]}, 11),
+]
+
+
+@pytest.mark.parametrize('name, input_, expected', INPUTS)
+@pytest.mark.parametrize('presolve', [False, True])
+def test_encodings_give_the_same_optimum(name, input_, expected, presolve):
+    model = ProblemModel(os.path.join(ROOT, 'problem', '{}.json'.format(name)))
+    for prefix_sum in ('shared', 'aux', 'naive'):
+        result, _, specs = model.solve(input_=input_, prefix_sum=prefix_sum, presolve=presolve)
+        assert specs['status'] == 'optimal'
+        assert result.as_long() == expected, prefix_sum
+
+
+def test_shared_sums_reuse_the_prefix():
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'sequence.json'))
+    input_ = os.path.join(ROOT, 'data', 'sequence', 'data1.txt')
+    counts = {}
+    for prefix_sum in ('shared', 'naive'):
+        _, _, specs = model.solve(input_=input_, prefix_sum=prefix_sum, nosolve=True)
+        counts[prefix_sum] = specs['n_unit']
+    assert counts['shared'] < counts['naive']
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+
+from ProblemModel import ProblemModel, _simplex
+
+inf = np.inf
+
+
+def test_simplex_optimal():
+    # max x + y with x + 2y <= 4, 3x + y <= 6, x, y >= 0: optimum at (8/5, 6/5)
+    status, z, value = _simplex(np.array([1.0, 1.0]), np.array([[1.0, 2.0], [3.0, 1.0]]),
+        np.array([4.0, 6.0]), np.zeros((0, 2)), np.zeros(0), np.zeros(2), np.full(2, inf))
+    assert status == 'optimal'
+    assert np.allclose(z, [1.6, 1.2])
+    assert abs(value - 2.8) < 1e-9
+
+
+def test_simplex_unbounded():
+    status, z, value = _simplex(np.array([1.0, 0.0]), np.array([[-1.0, 1.0]]), np.array([1.0]),
+        np.zeros((0, 2)), np.zeros(0), np.zeros(2), np.full(2, inf))
+    assert (status, z, value) == ('unbounded', None, None)
+
+
+def test_simplex_infeasible():
+    # x + y = 5 with both in [0, 2]
+    status, z, value = _simplex(np.array([1.0, 1.0]), np.zeros((0, 2)), np.zeros(0),
+        np.array([[1.0, 1.0]]), np.array([5.0]), np.zeros(2), np.full(2, 2.0))
+    assert (status, z, value) == ('infeasible', None, None)
+
+
+def _model(tmp_path, constraint):
+    problem = {'language': 'en', 'text': 'find the maximum', 'objective':
+        {'goal': 'max', 'type': 'int', 'index': [9, 15]}, 'variable': {'type': 'int', 'length': 'n'},
+        'input': [{'name': 'n'}, {'name': 'c', 'type': 'intarray', 'length': 'n'}],
+        'constraint': constraint}
+    path = tmp_path / 'problem.json'
+    path.write_text(json.dumps(problem))
+    return ProblemModel(str(path))
+
+
+def test_relax_unused_variable(tmp_path):
+    # x[n-1] is in no constraint, so it only gets a column for reading x back
+    model = _model(tmp_path, [
+        {'type': 'sum', 'term': 'c[i]*x[i]', 'range': [0, 'n-2'], 'comp': '=', 'rval': 'y',
+            'loopvar': 'i'},
+        {'type': 'loop', 'loopvar': 'i', 'range': [0, 'n-2'], 'term': 'x[i]', 'comp': '<=',
+            'rval': '1'},
+        {'type': 'loop', 'loopvar': 'i', 'range': [0, 'n-2'], 'term': 'x[i]', 'comp': '>=',
+            'rval': '0'}])
+    inputs = {'n': 4, 'c': [1, 2, 3, 4]}
+    plain, _, _ = model.solve(input_=inputs)
+    relaxed, assignment, specs = model.solve(input_=inputs, relax=True)
+    assert plain.as_long() == 6
+    assert relaxed.as_long() == 6
+    assert specs['relax'] == 'integral'
+    assert len(assignment['x']) == 4
+
+
+def test_relax_unbounded_keeps_solve(tmp_path):
+    # nothing bounds x[0] from above, so the LP gives no bound and z3 decides
+    model = _model(tmp_path, [
+        {'type': 'sum', 'term': 'c[i]*x[i]', 'comp': '=', 'rval': 'y', 'loopvar': 'i'},
+        {'term': 'x[0]', 'comp': '>=', 'rval': '0'}])
+    _, _, specs = model.solve(input_={'n': 1, 'c': [1]}, relax=True, timeout=5)
+    assert specs['relax'] == 'unbounded'
+    assert 'relax_bound' not in specs
+
+
+def test_relax_infeasible_left_to_z3(tmp_path):
+    model = _model(tmp_path, [
+        {'type': 'sum', 'term': 'c[i]*x[i]', 'comp': '=', 'rval': 'y', 'loopvar': 'i'},
+        {'term': 'x[0]', 'comp': '>=', 'rval': '2'},
+        {'term': 'x[0]', 'comp': '<=', 'rval': '1'}])
+    result, _, specs = model.solve(input_={'n': 1, 'c': [1]}, relax=True)
+    assert specs['relax'] == 'infeasible'
+    assert specs['status'] == 'unsat'
+    assert result == False
@@ -0,0 +1,26 @@
+import asyncio
+import json
+import os
+
+from server import Server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COINS = {'n': 3, 'coins': [1, 2, 5], 'amount': 11}
+
+
+def test_memory_limit_of_a_request_ends_with_it(tmp_path):
+    server = Server(problem_dir=os.path.join(ROOT, 'problem'), workers=1,
+        registry_cache=str(tmp_path))
+
+    async def run():
+        limited = await server.handle(json.dumps({'id': 1, 'problem': 'coins',
+            'inputs': COINS, 'max_memory': 1}))
+        plain = await server.handle(json.dumps({'id': 2, 'problem': 'coins', 'inputs': COINS}))
+        return limited, plain
+
+    try:
+        limited, plain = asyncio.run(run())
+    finally:
+        server.pool.shutdown()
+    assert limited['status'] == 'error'
+    assert plain['status'] == 'ok' and plain['result'] == 3
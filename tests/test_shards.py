@@ -0,0 +1,57 @@
+import json
+import os
+import random
+
+import pytest
+
+from ProblemModel import ProblemModel
+from tests.test_dedupe import REPEATS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build(model, input_, shards=None, **kwargs):
+    # the assertions of a build and its counts; z3 frees terms that nothing
+    # holds, so the assertions are kept alive to compare by AST id
+    value_dict = model._values(input_=input_)
+    opt, x, y = model._declare(dict(value_dict))
+    specs = {'n_constraint': 0, 'n_unit': 0, 'n_prefix': 0, 'n_affine': 0, 'n_duplicate': 0}
+    if shards == None:
+        prefix = ProblemModel._prefix_state(kwargs.get('prefix_sum', 'shared'))
+        ProblemModel._build(model.constraint, dict(value_dict), x, y, opt, specs,
+            prefix=prefix, affine={}, dedupe=kwargs.get('dedupe', True))
+    else:
+        assert model._build_shards(model.constraint, dict(value_dict), x, y, opt, specs,
+            shards, {}, **kwargs)
+    return list(opt.assertions()), specs
+
+
+def ids(assertions):
+    return [a.get_id() for a in assertions]
+
+
+@pytest.mark.parametrize('prefix_sum, dedupe',
+    [('shared', True), ('aux', True), ('naive', True), ('shared', False)])
+def test_shards_assert_what_a_serial_build_does(prefix_sum, dedupe):
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'sequence.json'))
+    rng = random.Random(2)
+    n = 400
+    input_ = {'n': n, 'arr': [rng.randint(-500, 500) for _ in range(n)], 'k': n // 4}
+    serial, counts = build(model, input_, prefix_sum=prefix_sum, dedupe=dedupe)
+    sharded, sharded_counts = build(model, input_, shards=2, prefix_sum=prefix_sum,
+        dedupe=dedupe)
+    assert ids(sharded) == ids(serial)
+    assert sharded_counts['n_shard'] > 1
+    assert sharded_counts['n_constraint'] == counts['n_constraint']
+
+
+def test_shards_drop_the_repeats_of_other_shards(tmp_path):
+    path = tmp_path / 'repeats.json'
+    path.write_text(json.dumps(REPEATS))
+    model = ProblemModel(str(path))
+    serial, counts = build(model, {'n': 1000})
+    sharded, sharded_counts = build(model, {'n': 1000}, shards=2)
+    assert ids(sharded) == ids(serial)
+    assert sharded_counts['n_shard'] > 1
+    assert (sharded_counts['n_constraint'], sharded_counts['n_duplicate']) == \
+        (counts['n_constraint'], counts['n_duplicate'])
@@ -0,0 +1,48 @@
+import os
+import random
+
+import pytest
+
+import ProblemModel as module
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('prefix_sum', ['shared', 'aux', 'naive'])
+def test_cached_build_gives_the_same_optimum(tmp_path, prefix_sum):
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'sequence.json'))
+    input_ = os.path.join(ROOT, 'data', 'sequence', 'data1.txt')
+    expected, _, _ = model.solve(input_=input_, prefix_sum=prefix_sum)
+    for status in ('miss', 'hit'):
+        result, _, specs = model.solve(input_=input_, prefix_sum=prefix_sum,
+            smt_cache=str(tmp_path))
+        assert specs['smt_cache'] == status
+        assert result.as_long() == expected.as_long()
+
+
+def test_shared_prefix_sums_stay_small(tmp_path):
+    # a chain of n shared prefix sums, which opt.sexpr() wrote out in O(n^2)
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'sequence.json'))
+    rng = random.Random(1)
+    n = 2000
+    input_ = {'n': n, 'arr': [rng.randint(-500, 500) for _ in range(n)], 'k': n // 2}
+    _, _, built = model.solve(input_=input_, nosolve=True, smt_cache=str(tmp_path))
+    _, _, loaded = model.solve(input_=input_, nosolve=True, smt_cache=str(tmp_path))
+    assert loaded['smt_cache'] == 'hit'
+    assert loaded['n_constraint'] == built['n_constraint']
+    files = os.listdir(tmp_path)
+    assert len(files) == 1
+    assert os.path.getsize(tmp_path / files[0]) < 2 << 20
+    assert loaded['time_constraint'] < built['time_constraint']
+
+
+def test_failed_write_leaves_no_file(tmp_path, monkeypatch):
+    def fail(f, exprs):
+        raise KeyboardInterrupt()
+    monkeypatch.setattr(module, '_write_smt', fail)
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    with pytest.raises(KeyboardInterrupt):
+        model.solve(input_={'n': 3, 'coins': [1, 2, 5], 'amount': 11}, nosolve=True,
+            smt_cache=str(tmp_path))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from ProblemModel import ProblemModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failing_input_does_not_stop_the_others(tmp_path, workers):
+    model = ProblemModel(os.path.join(ROOT, 'problem', 'coins.json'))
+    good = tmp_path / 'good.txt'
+    good.write_text('3\n1 2 5\n11\n')
+    missing = str(tmp_path / 'missing.txt')
+    out = {input_: (result, specs) for input_, result, specs in
+        model.solve_many([missing, str(good)], workers=workers)}
+    assert out[str(good)][0] == 3
+    assert out[missing][0] == None
+    assert out[missing][1]['status'] == 'error'
+    assert 'missing.txt' in out[missing][1]['reason']